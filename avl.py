@@ -9,6 +9,7 @@ Xiaowen Wang
 """
 
 from bst import BST
+from node import AVLNode
 
 
 class AVL(BST):
@@ -16,58 +17,38 @@ class AVL(BST):
     AVL Tree
     """
 
-    def _rotate_right(self, node):
+    _node_class = AVLNode
+
+    @staticmethod
+    def _height(node):
         """
-        Right rotation
+        Return the cached height of node, 0 for an empty subtree
         """
-        parent = self.get_parent(node)
-        is_right_child = False
-
-        if parent:
-            if node is parent.right:
-                is_right_child = True
-
-        new_p = node.left
-        node.left = new_p.right
-        new_p.right = node
-
-        if parent:
-            if is_right_child:
-                parent.right = new_p
-            else:
-                parent.left = new_p
-        else:
-            self._root = new_p
+        return node.height if node else 0
 
-    def _rotate_left(self, node):
+    def _update_node(self, node):
         """
-        Left rotation
+        Override
+        Refresh the cached size and height of node from its children
         """
-        parent = self.get_parent(node)
-        is_left_child = False
-
-        if parent:
-            if node is parent.left:
-                is_left_child = True
+        super(AVL, self)._update_node(node)
+        node.height = 1 + max(self._height(node.left),
+                              self._height(node.right))
 
-        # right child becomes new parent
-        new_p = node.right
-        # deal with the left child of previously right child
-        node.right = new_p.left
-        # the current node becomes left child
-        new_p.left = node
+    def _get_balance(self, node):
+        """
+        Override
+        Return the balance of node from the cached heights
+        """
+        if node is None:
+            return 0
 
-        if parent:
-            if is_left_child:
-                parent.left = new_p
-            else:
-                parent.right = new_p
-        else:
-            self._root = new_p
+        return self._height(node.left) - self._height(node.right)
 
     def _balance_node(self, node):
         """
-        Balance the subtree from the given node
+        Balance the subtree from the given node,
+        return the root of the subtree afterwards
         """
         # get the balance of given node
         bal = self._get_balance(node)
@@ -78,7 +59,7 @@ class AVL(BST):
             # then needs left rotation first
             if self._get_balance(node.left) < 0:
                 self._rotate_left(node.left)
-            self._rotate_right(node)
+            return self._rotate_right(node)
 
         # heavily-right subtree needs left rotation
         if bal < -1:
@@ -86,7 +67,26 @@ class AVL(BST):
             # then needs right rotation first
             if self._get_balance(node.right) > 0:
                 self._rotate_right(node.right)
-            self._rotate_left(node)
+            return self._rotate_left(node)
+
+        return node
+
+    def _retrace_delete(self, node):
+        """
+        Rebalance from the given node up to root after a delete
+        """
+        while node:
+            old_height = node.height
+            self._update_node(node)
+
+            # a rotation may lift another node to the subtree root
+            node = self._balance_node(node)
+
+            if node.height == old_height:
+                # the subtree height is unchanged, so are the ancestors
+                break
+
+            node = node.parent
 
     def insert(self, key, data=None):
         """
@@ -95,61 +95,257 @@ class AVL(BST):
         """
         # get new node
         new_node = super(AVL, self).insert(key, data)
-
-        if new_node is self._root:
-            return self._root
-        else:
-            node = new_node
-            # balance the new tree from the new node to root
-            while node:
+        if new_node.count > 1:
+            # an existing key is counted again, nothing is changed
+            return new_node
+
+        # retrace from the parent of new node toward root
+        node = new_node.parent
+        while node:
+            old_height = node.height
+            self._update_node(node)
+
+            if abs(self._get_balance(node)) > 1:
+                # one (double) rotation brings the subtree back to
+                # its height before the insert, nothing above changes
                 self._balance_node(node)
-                node = self.get_parent(node)
+                break
+
+            if node.height == old_height:
+                # the subtree height is unchanged, so are the ancestors
+                break
+
+            node = node.parent
 
         return new_node
 
-    def _delete(self, node, key, parent=None):
+    def _rebalance_up(self, node):
         """
-        Internal delete method
+        Refresh and balance from the given node up to the top of
+        its subtree, return the top afterwards
         """
-        if node is None:
-            # No such node storing given data
-            return
+        top = node
+        while node:
+            self._update_node(node)
+            node = self._balance_node(node)
+            top = node
+            node = node.parent
+        return top
+
+    def _join3(self, left, pivot, right):
+        """
+        Join two subtrees and a detached pivot node in between,
+        all keys in left are less than the pivot's and
+        those in right are not, return the root of the result.
+        It takes O(|height(left) - height(right)| + 1).
+        """
+        if left is not None:
+            left.parent = None
+        if right is not None:
+            right.parent = None
+
+        # NOTE: the rotations at the top of a detached subtree
+        # also set self._root, the caller sets it at the end anyway.
+        lh = self._height(left)
+        rh = self._height(right)
+
+        if lh > rh + 1:
+            # Go down the right spine of left to a subtree
+            # as high as right, and hang the pivot there.
+            node = left
+            while self._height(node.right) > rh + 1:
+                node = node.right
+            pivot.left = node.right
+            pivot.right = right
+            node.right = pivot
+            pivot.parent = node
+
+        elif rh > lh + 1:
+            # The mirror of the above
+            node = right
+            while self._height(node.left) > lh + 1:
+                node = node.left
+            pivot.left = left
+            pivot.right = node.left
+            node.left = pivot
+            pivot.parent = node
 
-        if key < node.key:
-            self._delete(node.left, key, parent=node)
+        else:
+            # Close enough in height, the pivot is the new root.
+            pivot.left = left
+            pivot.right = right
+            pivot.parent = None
 
-        elif key > node.key:
-            self._delete(node.right, key, parent=node)
+        if pivot.left is not None:
+            pivot.left.parent = pivot
+        if pivot.right is not None:
+            pivot.right.parent = pivot
 
-        else:
-            # Found the node
-            if node.left and node.right:
-                # The node has both two chilren
-                successor, successor_p = self._find_min_node(node.right, parent=node)
-                node.key = successor.key
-                node.data = successor.data
-                self._delete(successor, successor.key, successor_p)
-
-            elif node.left:
-                # The node only has one left child
-                self._delete_node_with_child(node, child=node.left, parent=parent)
-                # then balance the parent
-                if parent:
-                    self._balance_node(parent)
-
-            elif node.right:
-                # The node only has one right child
-                self._delete_node_with_child(node, child=node.right, parent=parent)
-                # then balance the parent
-                if parent:
-                    self._balance_node(parent)
+        return self._rebalance_up(pivot)
+
+    def _pop_min(self, node):
+        """
+        Take the min node out of the subtree,
+        return it (detached) and the root of the rest.
+        """
+        while node.left is not None:
+            node = node.left
+
+        parent = node.parent
+        child = node.right
+        if child is not None:
+            child.parent = parent
+        if parent is not None:
+            parent.left = child
+
+        node.right = None
+        node.parent = None
+
+        if parent is None:
+            return node, child
+        return node, self._rebalance_up(parent)
 
+    def _split(self, node, key, inclusive=False):
+        """
+        Override
+        Split the subtree by key into two balanced ones, return the roots
+        of the one with keys less than key (or equal to, if inclusive)
+        and the one with the rest, in O(log n).
+        """
+        # Go down the search path of key, marking the side of each node.
+        path = []
+        while node is not None:
+            to_left = node.key < key or (node.key == key and inclusive)
+            path.append((node, to_left))
+            node = node.right if to_left else node.left
+
+        # From the bottom up, every node joins the part of its side
+        # with its subtree which is not on the path.
+        left = right = None
+        for node, to_left in reversed(path):
+            if to_left:
+                left = self._join3(node.left, node, left)
             else:
-                # The node is a leaf
-                self._delete_node_with_child(node, parent=parent)
-                # then check the parent's balance
-                if parent:
-                    self._balance_node(parent)
+                right = self._join3(right, node, node.right)
+
+        return left, right
+
+    def _concat(self, left, right):
+        """
+        Override
+        Concatenate two subtrees into a balanced one, all keys in left
+        are less than those in right, return the root of the result.
+        """
+        if left is None:
+            return right
+        if right is None:
+            return left
+
+        # The min node of right is the pivot.
+        pivot, right = self._pop_min(right)
+        return self._join3(left, pivot, right)
+
+    def _take_root(self):
+        """
+        Take all the nodes out of the tree, return the root
+        """
+        root = self._root
+        self._root = None
+        self._mod_count += 1
+        return root
+
+    def _wrap(self, root):
+        """
+        Return a new tree of the same kind with the given root
+        """
+        tree = self.__class__(multiset=self._multiset)
+        tree._root = root
+        if root is not None:
+            root.parent = None
+        return tree
+
+    def split(self, key, inclusive=False):
+        """
+        Split the tree by key into two trees in O(log n),
+        the one with keys less than key (or equal to, if inclusive)
+        and the one with the rest.
+        All the nodes are moved, the tree is left empty.
+        """
+        left, right = self._split(self._take_root(), key, inclusive)
+        # The rotations on the way may have set the root again.
+        self._root = None
+        return self._wrap(left), self._wrap(right)
+
+    @classmethod
+    def _check_kind(cls, tree):
+        """
+        Raise TypeError if the nodes of tree are not of the kind of cls,
+        e.g. the nodes of a persistent tree, shared with other versions,
+        may not be moved into a plain AVL tree.
+        """
+        if tree._node_class is not cls._node_class:
+            raise TypeError("cannot join a %s into a %s" % (type(tree).__name__, cls.__name__))
+
+    @staticmethod
+    def _check_order(left, right):
+        """
+        Raise ValueError if the key of left is not less than that of right,
+        an empty (None) node is in order with anything.
+        """
+        if left is None or right is None:
+            return
+        if not left.key < right.key:
+            raise ValueError("keys out of order: %r and %r" % (left.key, right.key))
+
+    @classmethod
+    def join(cls, left, right):
+        """
+        Join two trees into one in O(log n),
+        all keys in left must be less than those in right.
+        All the nodes are moved, both trees are left empty.
+        """
+        cls._check_kind(left)
+        cls._check_kind(right)
+        if left.multiset != right.multiset:
+            raise ValueError("cannot join a multiset with a non-multiset tree")
+        cls._check_order(left.root and left.get_max_node(),
+                         right.root and right.get_min_node())
+
+        tree = cls(multiset=left.multiset)
+        tree._root = tree._concat(left._take_root(), right._take_root())
+        return tree
+
+    @classmethod
+    def join3(cls, left, pivot, right, data=None):
+        """
+        Join two trees and a pivot key in between into one in O(log n),
+        all keys in left must be less than the pivot,
+        and those in right greater than it.
+        All the nodes are moved, both trees are left empty.
+        """
+        cls._check_kind(left)
+        cls._check_kind(right)
+        if left.multiset != right.multiset:
+            raise ValueError("cannot join a multiset with a non-multiset tree")
+
+        tree = cls(multiset=left.multiset)
+        node = tree._new_node(pivot, data)
+        cls._check_order(left.root and left.get_max_node(), node)
+        cls._check_order(node, right.root and right.get_min_node())
+
+        tree._root = tree._join3(left._take_root(), node, right._take_root())
+        return tree
+
+    def _delete(self, node, key, parent=None):
+        """
+        Override
+        Internal delete method, still keeping balanced
+        """
+        parent = super(AVL, self)._delete(node, key, parent)
+
+        # balance from the parent of the removed node up to root
+        self._retrace_delete(parent)
+        return parent
 
 
 if __name__ == "__main__":
@@ -0,0 +1,6 @@
+"""
+Benchmarks
+
+Run from the top of the repository, e.g.
+    python -m benchmark.avl_insert
+"""
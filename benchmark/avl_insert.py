@@ -0,0 +1,43 @@
+#!/usr/bin/python
+
+"""
+AVL insert benchmark:
+the cost per insert should stay flat (logarithmic) as the tree grows.
+
+Usage: python -m benchmark.avl_insert [max_power_of_ten]
+"""
+
+import random
+import sys
+import time
+
+from avl import AVL
+
+
+def bench_insert(n, seed=0):
+    """
+    Insert n shuffled keys, return the average seconds per insert
+    """
+    keys = range(n)
+    random.Random(seed).shuffle(keys)
+
+    avl = AVL()
+    start = time.time()
+    for k in keys:
+        avl.insert(k)
+    elapsed = time.time() - start
+
+    assert avl.get_max_depth() == avl.root.height
+    return elapsed / n
+
+
+if __name__ == "__main__":
+
+    max_exp = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+
+    print "%10s %12s" % ("keys", "us/insert")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        print "%10d %12.2f" % (n, bench_insert(n) * 1e6)
+
+    exit(0)
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+
+"""
+AVL shard rebalancing benchmark:
+move the top 10% of the keys of one shard to the next shard,
+by split + join vs one delete and one insert per key.
+
+Usage: python -m benchmark.avl_shard [num_of_keys]
+"""
+
+import sys
+import time
+
+from avl import AVL
+
+
+def make_shards(num_keys):
+    """
+    Return two adjacent shards of num_keys keys each
+    """
+    low = AVL.from_sorted((k, k) for k in xrange(num_keys))
+    high = AVL.from_sorted((k, k) for k in xrange(num_keys, 2 * num_keys))
+    return low, high
+
+
+def move_by_split(low, high, cut):
+    """
+    Move the keys from cut on of low to high, return the new shards
+    """
+    low, moved = low.split(cut)
+    return low, AVL.join(moved, high)
+
+
+def move_by_key(low, high, cut):
+    """
+    Move the keys from cut on of low to high, one by one
+    """
+    moved = [(node.key, node.data) for node in low.range(cut, len(low))]
+    for key, data in moved:
+        low.delete(key)
+        high.insert(key, data)
+    return low, high
+
+
+if __name__ == "__main__":
+
+    num_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    cut = num_keys - num_keys / 10
+
+    print "Two shards of %d keys, moving keys [%d, %d)" % (num_keys, cut, num_keys)
+    print "%-14s %10s %10s %10s %8s" % ("method", "seconds", "low", "high", "depth")
+    for name, move in [("split + join", move_by_split),
+                       ("delete/insert", move_by_key)]:
+        low, high = make_shards(num_keys)
+
+        start = time.time()
+        low, high = move(low, high, cut)
+        elapsed = time.time() - start
+
+        assert low.is_valid() and high.is_valid()
+        print "%-14s %10.4f %10d %10d %8d" % (
+            name, elapsed, len(low), len(high), high.get_max_depth())
+
+    exit(0)
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+"""
+AVL soak benchmark:
+a long random mix of inserts and deletes must keep the tree balanced,
+with its height staying within 1.44 * log2(n).
+
+Usage: python -m benchmark.avl_soak [num_of_ops] [key_space]
+"""
+
+import math
+import random
+import sys
+import time
+
+from avl import AVL
+
+
+def soak(num_ops, key_space, seed=0, check_every=None):
+    """
+    Run a random insert/delete mix, checking the shape on the way
+    """
+    rnd = random.Random(seed)
+    check_every = check_every or max(1, num_ops / 10)
+
+    avl = AVL()
+    present = set()
+
+    print "%10s %8s %8s %8s %10s" % ("ops", "keys", "height", "log2(n)", "balanced")
+
+    start = time.time()
+    for i in range(1, num_ops + 1):
+        key = rnd.randrange(key_space)
+        if key in present:
+            avl.delete(key)
+            present.discard(key)
+        else:
+            avl.insert(key)
+            present.add(key)
+
+        if i % check_every == 0:
+            n = len(present)
+            height = avl.root.height if avl.root else 0
+            balanced = avl.is_balanced()
+            print "%10d %8d %8d %8.2f %10s" % (
+                i, n, height, math.log(n, 2) if n else 0, balanced)
+            assert balanced
+            assert height <= 1.45 * math.log(n + 2, 2)
+
+    elapsed = time.time() - start
+    print "%.2f us/op" % (elapsed / num_ops * 1e6)
+
+
+if __name__ == "__main__":
+
+    num_ops = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    key_space = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    soak(num_ops, key_space)
+
+    exit(0)
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+"""
+Concurrent tree benchmark:
+throughput against thread count for 95/5 and 50/50 read/write mixes,
+with the reader-writer lock and with one global lock.
+
+Usage: python -m benchmark.ctree_threads [num_of_keys] [ops_per_thread]
+"""
+
+import random
+import sys
+import threading
+import time
+
+from avl import AVL
+from ctree import ConcurrentTree
+
+
+class GlobalLockTree(object):
+    """
+    The baseline: every call goes under one lock
+    """
+
+    def __init__(self, tree):
+        self._tree = tree
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        with self._lock:
+            return self._tree.lookup(key)
+
+    def insert(self, key, data=None):
+        with self._lock:
+            return self._tree.insert(key, data)
+
+    def delete(self, key):
+        with self._lock:
+            return self._tree.delete(key)
+
+
+def worker(tree, num_ops, read_ratio, key_space, seed):
+    rnd = random.Random(seed)
+    for _ in xrange(num_ops):
+        key = rnd.randrange(key_space)
+        r = rnd.random()
+        if r < read_ratio:
+            tree.lookup(key)
+        elif r < (1 + read_ratio) / 2:
+            tree.insert(key)
+        else:
+            tree.delete(key)
+
+
+def run(wrapper, num_threads, num_keys, num_ops, read_ratio):
+    """
+    Return the ops per second of all threads together
+    """
+    tree = wrapper(AVL.from_sorted((k, None) for k in xrange(0, num_keys * 2, 2)))
+    threads = [threading.Thread(target=worker,
+                                args=(tree, num_ops, read_ratio, num_keys * 2, i))
+               for i in range(num_threads)]
+
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    return num_threads * num_ops / elapsed
+
+
+if __name__ == "__main__":
+
+    num_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_ops = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    print "%d keys, %d ops per thread" % (num_keys, num_ops)
+    print "%-8s %-8s %12s %12s" % ("mix", "threads", "rwlock/s", "global/s")
+    for read_ratio in (0.95, 0.5):
+        mix = "%d/%d" % (read_ratio * 100, 100 - read_ratio * 100)
+        for num_threads in (1, 2, 4, 8):
+            rw = run(ConcurrentTree, num_threads, num_keys, num_ops, read_ratio)
+            gl = run(GlobalLockTree, num_threads, num_keys, num_ops, read_ratio)
+            print "%-8s %-8d %12.0f %12.0f" % (mix, num_threads, rw, gl)
+
+    exit(0)
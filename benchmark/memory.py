@@ -0,0 +1,77 @@
+#!/usr/bin/python
+
+"""
+Memory benchmark: bytes per key taken by the nodes of each structure.
+The node objects are walked and measured with sys.getsizeof,
+keys and payloads are not counted.
+
+Usage: python -m benchmark.memory [num_of_keys]
+"""
+
+import random
+import sys
+
+from avl import AVL
+from bh import MinHeap
+from bst import BST
+from rbt import RBTree
+from trie import Trie
+
+
+def _obj_bytes(obj):
+    """
+    Return the size of obj, with its instance dict if it has one
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def tree_bytes(tree):
+    return sum(_obj_bytes(node) for node in tree.iter_preorder())
+
+
+def heap_bytes(heap):
+    return sum(_obj_bytes(node) for node in heap._vec)
+
+
+def trie_bytes(trie):
+    total = 0
+    stack = [trie._root]
+    while stack:
+        node = stack.pop()
+        total += _obj_bytes(node)
+        if node.children is not None:
+            total += sys.getsizeof(node.children)
+            stack.extend(node.children.values())
+    return total
+
+
+if __name__ == "__main__":
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    rnd = random.Random(0)
+    keys = rnd.sample(xrange(n * 10), n)
+    words = ["%x" % rnd.getrandbits(48) for _ in xrange(n)]
+
+    print "%-8s %12s" % ("", "bytes/key")
+
+    for cls in (BST, AVL, RBTree):
+        tree = cls()
+        for k in keys:
+            tree.insert(k)
+        print "%-8s %12.1f" % (cls.__name__, tree_bytes(tree) / float(n))
+
+    heap = MinHeap()
+    for k in keys:
+        heap.insert(k)
+    print "%-8s %12.1f" % ("MinHeap", heap_bytes(heap) / float(n))
+
+    trie = Trie()
+    for w in words:
+        trie.insert(w)
+    print "%-8s %12.1f" % ("Trie", trie_bytes(trie) / float(n))
+
+    exit(0)
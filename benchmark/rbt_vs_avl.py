@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+"""
+Red-black tree vs AVL tree benchmark
+on insert-heavy, delete-heavy and lookup-heavy mixes.
+
+Usage: python -m benchmark.rbt_vs_avl [num_of_keys] [num_of_ops]
+"""
+
+import random
+import sys
+import time
+
+from avl import AVL
+from rbt import RBTree
+
+# (insert, delete, lookup) ratios of each mix
+MIXES = [
+    ("insert-heavy", (0.8, 0.1, 0.1)),
+    ("delete-heavy", (0.3, 0.5, 0.2)),
+    ("lookup-heavy", (0.05, 0.05, 0.9)),
+]
+
+
+def make_ops(num_keys, num_ops, ratios, seed=0):
+    """
+    Return the preloaded keys and a list of (op, key) to run
+    """
+    rnd = random.Random(seed)
+    key_space = num_keys * 4
+    preload = rnd.sample(xrange(key_space), num_keys)
+
+    present = list(preload)
+    ops = []
+    for _ in xrange(num_ops):
+        r = rnd.random()
+        if r < ratios[0] or not present:
+            key = rnd.randrange(key_space)
+            present.append(key)
+            ops.append(('insert', key))
+        elif r < ratios[0] + ratios[1]:
+            # Take a random present key out
+            i = rnd.randrange(len(present))
+            present[i], present[-1] = present[-1], present[i]
+            ops.append(('delete', present.pop()))
+        else:
+            ops.append(('lookup', present[rnd.randrange(len(present))]))
+
+    return preload, ops
+
+
+def run(cls, preload, ops):
+    """
+    Return the seconds spent on ops, and the final tree depth
+    """
+    tree = cls.from_sorted((k, None) for k in preload)
+
+    start = time.time()
+    for op, key in ops:
+        if op == 'lookup':
+            tree.lookup(key)
+        elif op == 'insert':
+            tree.insert(key)
+        else:
+            tree.delete(key)
+    elapsed = time.time() - start
+
+    return elapsed, tree.get_max_depth()
+
+
+if __name__ == "__main__":
+
+    num_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_ops = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    print "%d preloaded keys, %d ops per mix" % (num_keys, num_ops)
+    print "%-14s %-8s %10s %8s" % ("mix", "tree", "us/op", "depth")
+    for name, ratios in MIXES:
+        preload, ops = make_ops(num_keys, num_ops, ratios)
+        for cls in (AVL, RBTree):
+            elapsed, depth = run(cls, preload, ops)
+            print "%-14s %-8s %10.2f %8d" % (
+                name, cls.__name__, elapsed / num_ops * 1e6, depth)
+
+    exit(0)
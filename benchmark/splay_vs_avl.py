@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+"""
+Splay tree vs AVL tree benchmark on a Zipfian (s=1.1) lookup stream:
+the hot keys of a splay tree stay near the root.
+
+Both trees are built balanced from the same keys, then run the same
+stream of lookups. The depth is that of the node looked up,
+measured just before each lookup of a sample of the stream.
+
+Usage: python -m benchmark.splay_vs_avl [num_of_keys] [num_of_lookups]
+"""
+
+import random
+import sys
+import time
+
+from avl import AVL
+from splay import SplayTree
+
+from benchmark.workloads import ZipfSampler
+
+
+def make_stream(num_keys, num_lookups, s=1.1, seed=0):
+    """
+    Return the keys to look up
+    """
+    sampler = ZipfSampler(num_keys, s, random.Random(seed))
+    return [sampler() for _ in xrange(num_lookups)]
+
+
+def run(cls, num_keys, stream, num_samples):
+    """
+    Return the seconds per lookup, and the mean depth of the sample
+    """
+    tree = cls.from_sorted((k, None) for k in xrange(num_keys))
+
+    # Warm up on the first half, time the second half.
+    half = len(stream) / 2
+    lookup = tree.lookup
+    for key in stream[:half]:
+        lookup(key)
+
+    start = time.time()
+    for key in stream[half:]:
+        lookup(key)
+    elapsed = (time.time() - start) / (len(stream) - half)
+
+    # Carry on with the sample, measuring the depth before each lookup.
+    depth = 0
+    sample = stream[:num_samples]
+    for key in sample:
+        depth += len(tree.get_node_path(tree.ceiling(key)))
+        lookup(key)
+
+    return elapsed, float(depth) / len(sample)
+
+
+if __name__ == "__main__":
+
+    num_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    num_lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 400000
+
+    stream = make_stream(num_keys, num_lookups)
+
+    print "%d keys, %d Zipf(1.1) lookups" % (num_keys, num_lookups)
+    print "%-10s %12s %12s" % ("tree", "us/lookup", "mean depth")
+    for cls in (AVL, SplayTree):
+        elapsed, depth = run(cls, num_keys, stream, 10000)
+        print "%-10s %12.2f %12.2f" % (cls.__name__, elapsed * 1e6, depth)
+
+    exit(0)
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+
+"""
+Benchmark suite: drive BST, AVL, MinHeap and Trie with the seeded
+workloads (see workloads.py) over sizes from 10^3 up,
+and report ops/s, p50/p99 latency and peak memory.
+
+Every case (structure, workload, size) runs in a forked child process,
+so that its peak RSS (ru_maxrss) is its own. A case first inserts
+the n keys, then runs every read/write mix on the result:
+    BST, AVL - read: lookup,     write: delete and insert back the key
+    MinHeap  - read: min node,   write: extract min and insert the key
+    Trie     - read: search,     write: delete and insert back the key
+The plain BST is not run on the sorted and adversarial workloads
+above --bst-limit keys, where it is a chain and takes O(n^2).
+
+Usage: python -m benchmark.suite [--max-exp 6] [--ops N] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+from avl import AVL
+from bh import MinHeap
+from bst import BST
+from trie import Trie
+
+from benchmark.workloads import MIXES, WORKLOADS, insert_order, mix_ops
+
+timer = time.time
+
+
+def _word(key):
+    return "%x" % key
+
+
+def _tree_ops(tree):
+    insert = tree.insert
+    lookup = tree.lookup
+    delete = tree.delete
+
+    def write(key):
+        delete(key)
+        insert(key)
+
+    return insert, lookup, write
+
+
+def _heap_ops(heap):
+    insert = heap.insert
+    get_min = heap.get_min_node
+    extract_min = heap.extract_min
+
+    def write(key):
+        extract_min()
+        insert(key)
+
+    return insert, lambda key: get_min(), write
+
+
+def _trie_ops(trie):
+    insert = trie.insert
+    search = trie.search
+    delete = trie.delete
+
+    def write(key):
+        key = _word(key)
+        delete(key)
+        insert(key)
+
+    return (lambda key: insert(_word(key)),
+            lambda key: search(_word(key)),
+            write)
+
+
+# name -> (factory, function returning the insert, read, write functions)
+STRUCTURES = (
+    ('BST', BST, _tree_ops),
+    ('AVL', AVL, _tree_ops),
+    ('MinHeap', MinHeap, _heap_ops),
+    ('Trie', Trie, _trie_ops),
+)
+
+
+def _percentile(sorted_values, p):
+    """
+    Return the nearest-rank percentile p of the sorted values
+    """
+    if not sorted_values:
+        return 0.0
+    i = int(round(p / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[i]
+
+
+def _timed(fn, args):
+    """
+    Call fn on each of args, return the ops/s, p50 and p99 (in us)
+    """
+    latencies = []
+    append = latencies.append
+    for arg in args:
+        start = timer()
+        fn(arg)
+        append(timer() - start)
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': len(latencies) / total if total > 0 else 0.0,
+        'p50_us': _percentile(latencies, 50) * 1e6,
+        'p99_us': _percentile(latencies, 99) * 1e6,
+    }
+
+
+def run_case(name, workload, n, num_ops, seed):
+    """
+    Run one case in this process, return the results
+    """
+    factory, ops = dict((s[0], s[1:]) for s in STRUCTURES)[name]
+    keys = insert_order(workload, n, seed)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    structure = factory()
+    insert, read, write = ops(structure)
+    phases = {'insert': _timed(insert, keys)}
+
+    for read_ratio, mix in MIXES:
+        plan = mix_ops(workload, keys, num_ops, read_ratio, seed)
+        reads = [key for is_read, key in plan if is_read]
+        writes = [key for is_read, key in plan if not is_read]
+        phases[mix] = {'read': _timed(read, reads), 'write': _timed(write, writes)}
+
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS.
+    scale = 1 if sys.platform == 'darwin' else 1024
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        'structure': name,
+        'workload': workload,
+        'n': n,
+        'phases': phases,
+        'peak_rss_bytes': rss_after * scale,
+        'rss_growth_bytes': (rss_after - rss_before) * scale,
+    }
+
+
+def run_forked(name, workload, n, num_ops, seed):
+    """
+    Run one case in a forked child, return the results
+    """
+    if not hasattr(os, 'fork'):
+        return run_case(name, workload, n, num_ops, seed)
+
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            out = json.dumps(run_case(name, workload, n, num_ops, seed))
+        except Exception as e:
+            out = json.dumps({'structure': name, 'workload': workload,
+                              'n': n, 'error': repr(e)})
+        with os.fdopen(w, 'w') as f:
+            f.write(out)
+        os._exit(0)
+
+    os.close(w)
+    with os.fdopen(r) as f:
+        out = f.read()
+    os.waitpid(pid, 0)
+    return json.loads(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tree benchmark suite")
+    parser.add_argument('--min-exp', type=int, default=3,
+                        help="smallest size as a power of ten (default 3)")
+    parser.add_argument('--max-exp', type=int, default=5,
+                        help="largest size as a power of ten (default 5, up to 6)")
+    parser.add_argument('--ops', type=int, default=10000,
+                        help="operations per read/write mix (default 10000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bst-limit', type=int, default=10000,
+                        help="largest size of the plain BST on the sorted "
+                             "and adversarial workloads (default 10000)")
+    parser.add_argument('--structures', default=','.join(s[0] for s in STRUCTURES))
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--json', default='benchmark.json',
+                        help="the file to write the results (default benchmark.json)")
+    args = parser.parse_args(argv)
+
+    results = []
+    print "%-8s %-12s %8s %-18s %12s %9s %9s %10s" % (
+        "struct", "workload", "n", "phase", "ops/s", "p50 us", "p99 us", "peak MB")
+
+    for exp in range(args.min_exp, args.max_exp + 1):
+        n = 10 ** exp
+        for name in args.structures.split(','):
+            for workload in args.workloads.split(','):
+                if (name == 'BST' and workload in ('sorted', 'adversarial') and
+                        n > args.bst_limit):
+                    results.append({'structure': name, 'workload': workload, 'n': n,
+                                    'skipped': "degenerate BST above --bst-limit"})
+                    continue
+
+                result = run_forked(name, workload, n, args.ops, args.seed)
+                results.append(result)
+                if 'error' in result:
+                    print "%-8s %-12s %8d error: %s" % (name, workload, n, result['error'])
+                    continue
+
+                peak = result['peak_rss_bytes'] / 2.0 ** 20
+                rows = [('insert', result['phases']['insert'])]
+                for _, mix in MIXES:
+                    rows.append((mix + '/read', result['phases'][mix]['read']))
+                    rows.append((mix + '/write', result['phases'][mix]['write']))
+                for phase, stats in rows:
+                    print "%-8s %-12s %8d %-18s %12.0f %9.2f %9.2f %10.1f" % (
+                        name, workload, n, phase, stats['ops_per_sec'],
+                        stats['p50_us'], stats['p99_us'], peak)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': args.seed,
+        'ops_per_mix': args.ops,
+        'results': results,
+    }
+    with open(args.json, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    print "Results written to %s" % args.json
+
+
+if __name__ == "__main__":
+
+    main()
+    exit(0)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+"""
+Seeded workloads for the benchmarks.
+
+A workload is the order the n keys 0..n-1 are inserted in,
+and a sampler picking the keys the later operations touch:
+    uniform     - shuffled keys, uniform picks
+    sorted      - ascending keys, uniform picks
+    zipf        - shuffled keys, Zipfian picks (a few hot keys)
+    adversarial - zigzag keys (0, n-1, 1, n-2, ...) which make a chain
+                  of a plain BST, picks among the deepest keys
+"""
+
+import bisect
+import random
+
+WORKLOADS = ('uniform', 'sorted', 'zipf', 'adversarial')
+
+# (read ratio, name) of the read/write mixes
+MIXES = (
+    (0.9, 'read-heavy'),
+    (0.5, 'balanced'),
+    (0.1, 'write-heavy'),
+)
+
+
+class ZipfSampler(object):
+    """
+    Pick one of n items with the probability of rank r in proportion
+    to 1 / r^s, the ranks are shuffled over the items.
+    """
+
+    def __init__(self, n, s=1.1, rnd=None):
+        self._rnd = rnd or random.Random(0)
+
+        # The cumulative weights, searched by bisection.
+        total = 0.0
+        self._cdf = []
+        for r in xrange(1, n + 1):
+            total += 1.0 / r ** s
+            self._cdf.append(total)
+        self._total = total
+
+        self._items = range(n)
+        self._rnd.shuffle(self._items)
+
+    def __call__(self):
+        r = bisect.bisect_left(self._cdf, self._rnd.random() * self._total)
+        return self._items[min(r, len(self._items) - 1)]
+
+
+def insert_order(workload, n, seed=0):
+    """
+    Return the keys 0..n-1 in the order to insert
+    """
+    if workload == 'sorted':
+        return range(n)
+
+    if workload == 'adversarial':
+        keys = []
+        lo, hi = 0, n - 1
+        while lo <= hi:
+            keys.append(lo)
+            if lo != hi:
+                keys.append(hi)
+            lo += 1
+            hi -= 1
+        return keys
+
+    keys = range(n)
+    random.Random(seed).shuffle(keys)
+    return keys
+
+
+def key_sampler(workload, keys, seed=0):
+    """
+    Return a function picking a key of keys (in insert order) at random
+    """
+    rnd = random.Random(seed + 1)
+
+    if workload == 'zipf':
+        sampler = ZipfSampler(len(keys), rnd=rnd)
+        return lambda: keys[sampler()]
+
+    if workload == 'adversarial':
+        # The last inserted keys are the deepest ones.
+        tail = keys[-max(1, len(keys) / 100):]
+        return lambda: tail[rnd.randrange(len(tail))]
+
+    return lambda: keys[rnd.randrange(len(keys))]
+
+
+def mix_ops(workload, keys, num_ops, read_ratio, seed=0):
+    """
+    Return a list of (is_read, key) operations
+    """
+    pick = key_sampler(workload, keys, seed)
+    rnd = random.Random(seed + 2)
+    return [(rnd.random() < read_ratio, pick()) for _ in xrange(num_ops)]
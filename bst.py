@@ -7,8 +7,91 @@ Xiaowen Wang
 """
 
 import sys
+from collections import deque
+from operator import itemgetter
 
+from cursor import Cursor
+from lca import LCAIndex
 from node import BinaryNode
+from serial import dump_tree, load_tree
+
+
+def _prepare_pairs(items, duplicates='keep'):
+    """
+    Return the (key, data) pairs as a list sorted by key,
+    with the duplicate keys dealt with as required:
+        'keep'  - keep all of them
+        'first' - keep the first pair of each key
+        'last'  - keep the last pair of each key
+        'error' - raise ValueError
+    """
+    if duplicates not in ('keep', 'first', 'last', 'error'):
+        raise ValueError("Unknown duplicates option: %s" % duplicates)
+
+    pairs = list(items)
+
+    # Sorted input passes the check in O(n),
+    # otherwise pay for a stable O(n log n) sort.
+    for i in range(1, len(pairs)):
+        if pairs[i][0] < pairs[i - 1][0]:
+            pairs.sort(key=itemgetter(0))
+            break
+
+    if duplicates == 'keep':
+        return pairs
+
+    unique = []
+    for key, data in pairs:
+        if unique and unique[-1][0] == key:
+            if duplicates == 'error':
+                raise ValueError("Duplicate key: %s" % key)
+            if duplicates == 'last':
+                unique[-1] = (key, data)
+            continue
+        unique.append((key, data))
+
+    return unique
+
+
+def _key_groups(nodes):
+    """
+    Yield (key, list of data) for the keys of the in-order nodes,
+    the data is repeated for a key counted more than once.
+    """
+    key = datas = None
+    for node in nodes:
+        if datas is not None and node.key == key:
+            datas.extend([node.data] * node.count)
+            continue
+        if datas is not None:
+            yield key, datas
+        key = node.key
+        datas = [node.data] * node.count
+
+    if datas is not None:
+        yield key, datas
+
+
+def _merge_groups(groups1, groups2):
+    """
+    Merge two streams of (key, list of data) in key order,
+    yield (key, list of data from 1, list of data from 2),
+    an empty list if the key is missing from one side.
+    """
+    end = object()
+    g1 = next(groups1, end)
+    g2 = next(groups2, end)
+    while g1 is not end or g2 is not end:
+        if g2 is end or (g1 is not end and g1[0] < g2[0]):
+            yield g1[0], g1[1], []
+            g1 = next(groups1, end)
+        elif g1 is end or g2[0] < g1[0]:
+            yield g2[0], [], g2[1]
+            g2 = next(groups2, end)
+        else:
+            yield g1[0], g1[1], g2[1]
+            g1 = next(groups1, end)
+            g2 = next(groups2, end)
 
 
 class BST(object):
@@ -16,146 +99,394 @@ class BST(object):
     Binary Searching Tree
     """
 
-    def __init__(self):
+    _node_class = BinaryNode
+
+    def __init__(self, multiset=False):
         self._root = None
+        # In multiset mode, the equal keys share one node with a count,
+        # and the data of the first one.
+        self._multiset = multiset
+        self._mod_count = 0  # Bumped by every change, to invalidate the indexes
+        self._lca_index = None  # Built on demand by lca_index()
+
+    def __len__(self):
+        return self._root.size if self._root else 0
 
     @property
     def root(self):
         return self._root
 
-    def _insert(self, node, key, data):
-        if key < node.key:
-            if node.left is None:
-                node.left = BinaryNode(key, data)
-                return node.left
+    @property
+    def multiset(self):
+        return self._multiset
+
+    @classmethod
+    def from_sorted(cls, items, duplicates='keep', multiset=False):
+        """
+        Build a balanced tree from (key, data) pairs in O(n),
+        no rotation is needed.
+        Unsorted pairs are sorted first in O(n log n).
+        See _prepare_pairs() for the duplicates options.
+        In multiset mode, the pairs of an equal key are counted
+        in one node, which keeps the data of the first pair only.
+        """
+        pairs = _prepare_pairs(items, duplicates)
+
+        tree = cls(multiset=multiset)
+        nodes = []
+        for key, data in pairs:
+            if multiset and nodes and nodes[-1].key == key:
+                nodes[-1].count += 1
             else:
-                return self._insert(node.left, key, data)
-        else:
-            if node.right is None:
-                node.right = BinaryNode(key, data)
-                return node.right
+                nodes.append(tree._new_node(key, data))
+        tree._root = tree._link_balanced(nodes, 0, len(nodes))
+        return tree
+
+    def dump(self, path):
+        """
+        Dump the tree into a binary file, see serial.py for the format
+        """
+        dump_tree(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a tree dumped by the same kind of tree from a binary file
+        in O(n), no rebalancing is needed. Any dump loads into a plain BST.
+        """
+        return load_tree(cls, path)
+
+    def _link_balanced(self, nodes, lo, hi, parent=None):
+        """
+        Link the sorted nodes[lo:hi] into a balanced subtree,
+        return the root of the subtree.
+        """
+        if lo >= hi:
+            return None
+
+        # The middle one is the root, then build both sides from the halves.
+        mid = (lo + hi) / 2
+        node = nodes[mid]
+        node.parent = parent
+        node.left = self._link_balanced(nodes, lo, mid, node)
+        node.right = self._link_balanced(nodes, mid + 1, hi, node)
+        self._update_node(node)
+        return node
+
+    def _new_node(self, key, data):
+        """
+        Create a node for the tree
+        """
+        return self._node_class(key, data)
+
+    @staticmethod
+    def _size(node):
+        """
+        Return the cached size of node, 0 for an empty subtree
+        """
+        return node.size if node else 0
+
+    def _update_node(self, node):
+        """
+        Refresh the cached fields of node from its children
+        """
+        node.size = node.count + self._size(node.left) + self._size(node.right)
+
+    def _insert(self, node, key, data):
+        # Walk down until an empty slot is found for the key,
+        # every node on the way gets one more key in its subtree.
+        while True:
+            node.size += 1
+            if self._multiset and key == node.key:
+                # The key is there already, just count it.
+                node.count += 1
+                return node
+            if key < node.key:
+                if node.left is None:
+                    node.left = self._new_node(key, data)
+                    node.left.parent = node
+                    return node.left
+                node = node.left
             else:
-                return self._insert(node.right, key, data)
+                if node.right is None:
+                    node.right = self._new_node(key, data)
+                    node.right.parent = node
+                    return node.right
+                node = node.right
 
     def insert(self, key, data=None):
         """
-        Insert a node to the tree
+        Insert a node to the tree.
+        In multiset mode, inserting a key already there only counts it:
+        the node found is returned with the data of the first insert,
+        the given data is not kept.
         """
+        self._mod_count += 1
         if self._root is None:
-            self._root = BinaryNode(key, data)
+            self._root = self._new_node(key, data)
             return self._root
         else:
             return self._insert(self._root, key, data)
 
-    def _inorder(self, node):
-        if node is None:
-            return
-
-        self._inorder(node.left)
-        sys.stdout.write(str(node) + ' ')
-        self._inorder(node.right)
-
-    def print_inorder(self):
+    def _check_version(self, version):
         """
-        Print the tree in an in-order manner
+        Stop an iteration over the tree changed under it,
+        e.g. by the lookups of a splay tree
         """
-        if self._root is None:
-            print "The BST is empty"
-            return
+        if self._mod_count != version:
+            raise RuntimeError("the tree has changed during iteration")
 
-        print "The current BST (in-order) is:"
-        self._inorder(self._root)
-        sys.stdout.write('\n')
-        sys.stdout.flush()
+    def iter_inorder(self):
+        """
+        Yield the nodes in an in-order manner (ascending keys)
+        """
+        # The stack keeps the nodes whose left side is being visited.
+        version = self._mod_count
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node
+                self._check_version(version)
+                node = node.right
 
-    def _preorder(self, node):
-        if node is None:
-            return
+    def iter_reverse_inorder(self):
+        """
+        Yield the nodes in a reverse in-order manner (descending keys)
+        """
+        # The mirror of in-order, right side goes first.
+        version = self._mod_count
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.right
+            else:
+                node = stack.pop()
+                yield node
+                self._check_version(version)
+                node = node.left
 
-        sys.stdout.write(str(node) + ' ')
-        self._preorder(node.left)
-        self._preorder(node.right)
+    def iter_preorder(self):
+        """
+        Yield the nodes in a pre-order manner
+        """
+        version = self._mod_count
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            yield node
+            self._check_version(version)
+            # Push the right child first, so the left one is visited first.
+            if node.right is not None:
+                stack.append(node.right)
+            if node.left is not None:
+                stack.append(node.left)
+
+    def iter_postorder(self):
+        """
+        Yield the nodes in a post-order manner
+        """
+        version = self._mod_count
+        stack = []
+        last = None  # The last visited node
+        node = self._root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                top = stack[-1]
+                # Go to the right side if it has not been visited yet,
+                # otherwise both sides are done and visit the top node.
+                if top.right is not None and top.right is not last:
+                    node = top.right
+                else:
+                    last = stack.pop()
+                    yield last
+                    self._check_version(version)
 
-    def print_preorder(self):
+    def iter_level_order(self):
         """
-        print the tree in a pre-order manner
+        Yield the nodes in a level-order manner (breadth first)
         """
+        version = self._mod_count
+        # init a queue with root
+        queue = deque([self._root]) if self._root is not None else deque()
+
+        while queue:
+            # pop the front of queue
+            node = queue.popleft()
+            yield node
+            self._check_version(version)
+
+            # enqueue the left child
+            if node.left:
+                queue.append(node.left)
+
+            # enqueue the right child
+            if node.right:
+                queue.append(node.right)
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    def __reversed__(self):
+        return self.iter_reverse_inorder()
+
+    def _print_nodes(self, order, nodes):
         if self._root is None:
             print "The BST is empty"
             return
 
-        print "The current BST (pre-order) is:"
-        self._preorder(self._root)
+        print "The current BST (%s) is:" % order
+        for node in nodes:
+            sys.stdout.write(str(node) + ' ')
         sys.stdout.write('\n')
         sys.stdout.flush()
 
-    def _postorder(self, node):
-        if node is None:
-            return
+    def print_inorder(self):
+        """
+        Print the tree in an in-order manner
+        """
+        self._print_nodes("in-order", self.iter_inorder())
 
-        self._postorder(node.left)
-        self._postorder(node.right)
-        sys.stdout.write(str(node) + ' ')
+    def print_preorder(self):
+        """
+        print the tree in a pre-order manner
+        """
+        self._print_nodes("pre-order", self.iter_preorder())
 
     def print_postorder(self):
         """
         Print the tree in a post-order manner
         """
-        if self._root is None:
-            print "The BST is empty"
-            return
-
-        print "The current BST (post-order) is:"
-        self._postorder(self._root)
-        sys.stdout.write('\n')
-        sys.stdout.flush()
+        self._print_nodes("post-order", self.iter_postorder())
 
     def print_level_order(self):
         """
         Breadth first search
         """
-        if self._root is None:
-            print "The BST is empty"
-            return
+        self._print_nodes("level-order", self.iter_level_order())
 
-        # init a queue with root
-        queue = [self._root]
+    def _lookup(self, node, key):
+        while node is not None:
+            if key == node.key:
+                return node
 
-        print "The current BST (level-order) is:"
+            if key < node.key:
+                node = node.left
+            else:
+                node = node.right
 
-        while len(queue) > 0:
-            # print and pop the front of queue
-            node = queue.pop(0)
-            sys.stdout.write(str(node) + ' ')
+        return None
 
-            # enqueue the left child
-            if node.left:
-                queue.append(node.left)
+    def lookup(self, key):
+        """
+        Search a data in the tree
+        """
+        return self._lookup(self._root, key)
 
-            # enqueue the right child
-            if node.right:
-                queue.append(node.right)
+    def _rotate_right(self, node):
+        """
+        Right rotation
+        """
+        parent = node.parent
+        is_right_child = False
 
-        sys.stdout.write('\n')
-        sys.stdout.flush()
+        if parent:
+            if node is parent.right:
+                is_right_child = True
 
-    def _lookup(self, node, key):
-        if node is None:
-            return None
+        new_p = node.left
+        node.left = new_p.right
+        if node.left:
+            node.left.parent = node
+        new_p.right = node
+        node.parent = new_p
+        new_p.parent = parent
+
+        if parent:
+            if is_right_child:
+                parent.right = new_p
+            else:
+                parent.left = new_p
+        else:
+            self._root = new_p
+
+        # node is now the child of new_p, so refresh it first
+        self._update_node(node)
+        self._update_node(new_p)
+        return new_p
+
+    def _rotate_left(self, node):
+        """
+        Left rotation
+        """
+        parent = node.parent
+        is_left_child = False
 
-        if key == node.key:
-            return node
+        if parent:
+            if node is parent.left:
+                is_left_child = True
+
+        # right child becomes new parent
+        new_p = node.right
+        # deal with the left child of previously right child
+        node.right = new_p.left
+        if node.right:
+            node.right.parent = node
+        # the current node becomes left child
+        new_p.left = node
+        node.parent = new_p
+        new_p.parent = parent
 
-        if key < node.key:
-            return self._lookup(node.left, key)
+        if parent:
+            if is_left_child:
+                parent.left = new_p
+            else:
+                parent.right = new_p
         else:
-            return self._lookup(node.right, key)
+            self._root = new_p
 
-    def lookup(self, key):
+        # node is now the child of new_p, so refresh it first
+        self._update_node(node)
+        self._update_node(new_p)
+        return new_p
+
+    def lookup_many(self, keys):
         """
-        Search a data in the tree
+        Search a batch of keys,
+        return the nodes (None if not found) in the order of keys.
         """
-        return self._lookup(self._root, key)
+        keys = list(keys)
+        n = len(self)
+
+        # Descending for every key costs about m * log2(n),
+        # while sweeping the whole tree once costs n + m * log2(m).
+        if len(keys) * n.bit_length() < n:
+            lookup = self.lookup
+            return [lookup(key) for key in keys]
+
+        # Answer the sorted keys in one merged in-order sweep.
+        result = [None] * len(keys)
+        nodes = self.iter_inorder()
+        node = next(nodes, None)
+        for i in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[i]
+            while node is not None and node.key < key:
+                node = next(nodes, None)
+            if node is None:
+                break
+            if node.key == key:
+                result[i] = node
+
+        return result
 
     def _delete_node_with_child(self, node, child=None, parent=None):
         """
@@ -169,9 +500,14 @@ class BST(object):
         else:
             self._root = child
 
+        # The child takes over the position of the node
+        if child:
+            child.parent = parent
+
         # Release the current node from memory
         node.left = None
         node.right = None
+        node.parent = None
         node.key = None
         node.data = None
         del node
@@ -189,55 +525,102 @@ class BST(object):
         return cur_node, cur_parent
 
     def _delete(self, node, key, parent=None):
-        if node is None:
-            return
-
-        if key < node.key:
-            self._delete(node.left, key, parent=node)
+        """
+        Remove the node with key from the subtree,
+        return the parent of the node taken out of the tree.
+        """
+        # Look for the node to delete, keeping track of its parent.
+        while node is not None and key != node.key:
+            parent = node
+            if key < node.key:
+                node = node.left
+            else:
+                node = node.right
 
-        elif key > node.key:
-            self._delete(node.right, key, parent=node)
+        if node is None:
+            return None
 
-        else:
-            # Found the node to delete, there are 3 cases to deal with.
-            if node.left and node.right:
-                # If the node has both two children,
-                successor, successor_parent = self._find_min_node(node.right, parent=node)
-                node.key = successor.key
-                node.data = successor.data
-                self._delete(successor, successor.key, successor_parent)
-
-            elif node.left:
-                # If the node only has one left child,
-                # copy the left child to the node,
-                # and delete the node.
-                self._delete_node_with_child(node, child=node.left, parent=parent)
-
-            elif node.right:
-                # If the node only has one right child,
-                # copy the right child to the node,
-                # and delete the node.
-                self._delete_node_with_child(node, child=node.right, parent=parent)
-
-            else:
-                # If the node is a leaf, simply remove it from the tree.
-                self._delete_node_with_child(node, parent=parent)
+        # Every ancestor loses the keys of the node in its subtree.
+        ancestor = parent
+        while ancestor is not None:
+            ancestor.size -= node.count
+            ancestor = ancestor.parent
+
+        # Found the node to delete, there are 3 cases to deal with.
+        if node.left and node.right:
+            # If the node has both two children,
+            # copy the successor to the node,
+            # and delete the successor instead.
+            successor, successor_parent = self._find_min_node(node.right, parent=node)
+
+            # The successor moves up out of the subtrees in between.
+            ancestor = successor_parent
+            while ancestor is not node:
+                ancestor.size -= successor.count
+                ancestor = ancestor.parent
+            node.size -= node.count
+
+            node.key = successor.key
+            node.data = successor.data
+            node.count = successor.count
+            node, parent = successor, successor_parent
+
+        # Now the node has one or zero child:
+        # move the only child (if any) up to the node's position.
+        child = node.left if node.left else node.right
+        self._delete_node_with_child(node, child=child, parent=parent)
+
+        return parent
 
     def delete(self, key):
         """
-        Remove a node from the tree
+        Remove a node from the tree,
+        in multiset mode, remove one count of the key.
         """
+        if self._multiset:
+            node = self._lookup(self._root, key)
+            if node is None:
+                return
+            if node.count > 1:
+                # Just uncount the key, the node stays.
+                self._mod_count += 1
+                node.count -= 1
+                while node is not None:
+                    node.size -= 1
+                    node = node.parent
+                return
+
+        # A key not in the tree changes nothing,
+        # so the cursors and indexes stay valid.
+        size = len(self)
         self._delete(self._root, key)
+        if len(self) != size:
+            self._mod_count += 1
 
-    def _is_valid(self, node, min_val, max_val):
-        if node is None:
-            return True
+    def count(self, key):
+        """
+        Return the number of the given key in the tree.
+        """
+        return self.count_range(key, key, inclusive=True)
+
+    def _is_valid(self, node):
+        # Each entry is a node with the open key range it must fall into,
+        # None for no bound.
+        stack = [(node, None, None)] if node is not None else []
+        while stack:
+            node, min_val, max_val = stack.pop()
 
-        if node.key < min_val or node.key > max_val:
-            return False
+            if min_val is not None and not min_val < node.key:
+                return False
+            if max_val is not None and not node.key < max_val:
+                return False
 
-        return (self._is_valid(node.left, min_val, node.key - 1) and
-                self._is_valid(node.right, node.key + 1, max_val))
+            if node.left is not None:
+                stack.append((node.left, min_val, node.key))
+            if node.right is not None:
+                stack.append((node.right, node.key, max_val))
+
+        return True
 
     def is_valid(self):
         """
@@ -245,59 +628,137 @@ class BST(object):
         The right subtree of a node contains only nodes with keys greater than the node's key.
         Both the left and right subtrees must also be binary search tree.
         """
-        return self._is_valid(self._root, -sys.maxint - 1, sys.maxint)
+        return self._is_valid(self._root)
 
-    def _get_num_of_node(self, node):
-        if node is None:
-            return 0
+    def tree_stats(self):
+        """
+        Return the statistics of the tree in a dict,
+        all collected in one post-order traversal:
+            nodes        - number of nodes
+            leaves       - number of leaf nodes
+            height       - max depth of the tree
+            level_widths - number of nodes on each level, from root
+            balanced     - is it balanced?
+            full         - is it full?
+            complete     - is it complete?
+            perfect      - is it perfect?
+            diameter     - number of edges between the two farthest nodes
+            min, max     - the min and max keys
+        """
+        num = 0
+        leaves = 0
+        widths = []
+        balanced = True
+        full = True
+        diameter = 0
+        min_key = max_key = None
+
+        # The (height, perfect, complete) of the finished subtrees,
+        # an empty one is (0, True, True).
+        results = []
+
+        # Each entry is a node, its depth, and whether its children are done.
+        stack = [(self._root, 1, False)] if self._root is not None else []
+        while stack:
+            node, depth, done = stack.pop()
+
+            if not done:
+                if len(widths) < depth:
+                    widths.append(0)
+                widths[depth - 1] += 1
+
+                if min_key is None or node.key < min_key:
+                    min_key = node.key
+                if max_key is None or max_key < node.key:
+                    max_key = node.key
+
+                # Come back after both children, the left one goes first.
+                stack.append((node, depth, True))
+                if node.right is not None:
+                    stack.append((node.right, depth + 1, False))
+                if node.left is not None:
+                    stack.append((node.left, depth + 1, False))
+                continue
 
-        return 1 + (self._get_num_of_node(node.left) +
-                    self._get_num_of_node(node.right))
+            # The result of the right child is on the top of the left one.
+            r_height, r_perfect, r_complete = results.pop() if node.right else (0, True, True)
+            l_height, l_perfect, l_complete = results.pop() if node.left else (0, True, True)
+
+            num += 1
+            if node.left is None and node.right is None:
+                leaves += 1
+            elif node.left is None or node.right is None:
+                full = False
+
+            if abs(l_height - r_height) > 1:
+                balanced = False
+
+            diameter = max(diameter, l_height + r_height)
+
+            # A complete tree is either a perfect left subtree with
+            # a complete right one of the same height, or a complete left
+            # subtree with a perfect right one a level lower.
+            results.append((
+                1 + max(l_height, r_height),
+                l_perfect and r_perfect and l_height == r_height,
+                ((l_perfect and r_complete and l_height == r_height) or
+                 (l_complete and r_perfect and l_height == r_height + 1))))
+
+        height, perfect, complete = results.pop() if results else (0, True, True)
+
+        return {
+            'nodes': num,
+            'leaves': leaves,
+            'height': height,
+            'level_widths': widths,
+            'balanced': balanced,
+            'full': full,
+            'complete': complete,
+            'perfect': perfect,
+            'diameter': diameter,
+            'min': min_key,
+            'max': max_key,
+        }
 
     def get_num_of_node(self):
         """
         Return the number of node in the tree
         """
-        return self._get_num_of_node(self._root)
-
-    def _get_num_of_leaf_node(self, node):
-        if node is None:
-            return 0
-
-        if node.left is None and node.right is None:
-            return 1
-
-        return (self._get_num_of_leaf_node(node.left) +
-                self._get_num_of_leaf_node(node.right))
+        if self._multiset:
+            # The size counts the keys, not the nodes.
+            return self.tree_stats()['nodes']
+        return len(self)
 
     def get_num_of_leaf_node(self):
         """
         Return the number of leaf node in the tree
         """
-        return self._get_num_of_leaf_node(self._root)
-
-    def _get_num_of_node_with_level(self, node, k):
-        if node is None or k < 1:
-            return 0
-
-        if k == 1:
-            return 1
-
-        return (self._get_num_of_node_with_level(node.left, k - 1) +
-                self._get_num_of_node_with_level(node.right, k - 1))
+        return self.tree_stats()['leaves']
 
     def get_num_of_node_with_level(self, k):
         """
         Return the number of node in the level k.
         """
-        return self._get_num_of_node_with_level(self._root, k)
+        widths = self.tree_stats()['level_widths']
+        if 1 <= k <= len(widths):
+            return widths[k - 1]
+        return 0
 
     def _get_max_depth(self, node):
-        if node is None:
-            return 0
-
-        return 1 + max(self._get_max_depth(node.left),
-                       self._get_max_depth(node.right))
+        # Count the levels by breadth first traversal.
+        depth = 0
+        level = [node] if node is not None else []
+        while level:
+            depth += 1
+            next_level = []
+            for n in level:
+                if n.left is not None:
+                    next_level.append(n.left)
+                if n.right is not None:
+                    next_level.append(n.right)
+            level = next_level
+
+        return depth
 
     def get_max_depth(self):
         """
@@ -316,24 +777,13 @@ class BST(object):
         return (self._get_max_depth(node.left) -
                 self._get_max_depth(node.right))
 
-    def _is_balanced(self, node):
-        if node is None:
-            return True
-
-        if (abs(self._get_balance(node)) <= 1 and
-            self._is_balanced(node.left) and
-            self._is_balanced(node.right)):
-            return True
-
-        return False
-
     def is_balanced(self):
         """
         The height difference between left and right subtree should be less than 1;
         The left subtree is balanced;
         The right subtree is balanced;
         """
-        return self._is_balanced(self._root)
+        return self.tree_stats()['balanced']
 
     def is_complete(self):
         """
@@ -341,66 +791,14 @@ class BST(object):
         except possibly the last, is completely filled,
         and all nodes are as far left as possible.
         """
-        # Create a queue with root in
-        queue = [self._root] if self._root is not None else []
-
-        # By using breadth first traverse,
-        # mark down when the first non-full node is met.
-        non_full_node_found = False
-
-        while len(queue) > 0:
-            # Every time remove a parent node from the queue.
-            node = queue.pop(0)
-
-            if node.left:
-                if non_full_node_found:
-                    # If a non-full node has been found before,
-                    # this node should not have any left child.
-                    return False
-                else:
-                    # Otherwise continue to enqueue the left child.
-                    queue.append(node.left)
-
-            else:
-                # Found the non-full node if no left child.
-                non_full_node_found = True
-
-            if node.right:
-                if non_full_node_found:
-                    # If a non-full node has been found before,
-                    # this node should not have any right child.
-                    return False
-                else:
-                    # Otherwise continue to enqueue the right child.
-                    queue.append(node.right)
-
-            else:
-                # Found the non-full node if no right child.
-                non_full_node_found = True
-
-        # If the tree can be traversed by this BFT, then it is complete
-        return True
-
-    def _is_full(self, node):
-        if node is None:
-            return True
-
-        # If no child, it is OK
-        if node.left is None and node.right is None:
-            return True
-
-        # If there is only one child, it is not OK
-        if node.left is None or node.right is None:
-            return False
-
-        return self._is_full(node.left) and self._is_full(node.right)
+        return self.tree_stats()['complete']
 
     def is_full(self):
         """
         A full binary tree is a tree in which every node
         other than the leaves has two children.
         """
-        return self._is_full(self._root)
+        return self.tree_stats()['full']
 
     def is_perfect(self):
         """
@@ -408,54 +806,34 @@ class BST(object):
         have two children and all leaves are at same level.
         A perfect binary tree of height (h) has (2^h-1) nodes
         """
-        h = self._get_max_depth(self._root)
-        num = self._get_num_of_node(self._root)
-        return (num == (2 ** h - 1))
-
-    def _get_node_path(self, parent, node, path):
-        # If there is no more parent to the target node
-        # in this branch, just return.
-        if parent is None:
-            return False
-
-        # Then keep track of this parent node.
-        path.append(parent)
-
-        # If target node is found, return positive.
-        if node is parent:
-            return True
-
-        # If not, continue to search the left side of subtree.
-        if self._get_node_path(parent.left, node, path):
-            return True
-
-        # If not, continue to search the right side of subtree.
-        if self._get_node_path(parent.right, node, path):
-            return True
-
-        # If the target node cannot be found from both sides of subtree,
-        # remove the current parent node from the path record.
-        path.pop()
-        return False
+        return self.tree_stats()['perfect']
 
     def get_node_path(self, node):
         """
         Return the node path list to the given node from root
         """
         path = []
-        if node is not None:
-            self._get_node_path(self._root, node, path)
+
+        # Climb up from the node to the top by the parent links.
+        current = node
+        while current is not None:
+            path.append(current)
+            current = current.parent
+
+        # The node is not in this tree if the top is not the root.
+        if not path or path[-1] is not self._root:
+            return []
+
+        path.reverse()
         return path
 
     def get_parent(self, node):
         """
         Return the parent node of the given node.
         """
-        path = self.get_node_path(node)
-        if len(path) >= 2:
-            # The one before last node is the parent node.
-            return path[-2]
-        return None
+        if node is None:
+            return None
+        return node.parent
 
     def get_grandparent(self, node):
         """
@@ -487,6 +865,70 @@ class BST(object):
             return None
         return self.get_sibling(parent)
 
+    def _split_node(self, key1, key2):
+        """
+        Return the node where the search paths of the two keys split
+        """
+        node = self._root
+        while node is not None:
+            if key1 == node.key or key2 == node.key:
+                break
+            # Go on only while both keys go the same way.
+            if key1 < node.key and key2 < node.key:
+                node = node.left
+            elif node.key < key1 and node.key < key2:
+                node = node.right
+            else:
+                break
+        return node
+
+    def _depth_below(self, node, key):
+        """
+        Return the number of edges from node down to the key, -1 if not found
+        """
+        depth = 0
+        while node is not None:
+            if key == node.key:
+                return depth
+            node = node.left if key < node.key else node.right
+            depth += 1
+        return -1
+
+    def lca(self, key1, key2):
+        """
+        Return the nearest common parent of the nodes of the two keys,
+        None if any of them is not in the tree.
+        It is found by one descent from root comparing the keys.
+        """
+        node = self._split_node(key1, key2)
+        if (node is None or self._depth_below(node, key1) < 0 or
+                self._depth_below(node, key2) < 0):
+            return None
+        return node
+
+    def distance(self, key1, key2):
+        """
+        Return the distance between the nodes of the two keys,
+        -1 if any of them is not in the tree.
+        """
+        node = self._split_node(key1, key2)
+        if node is None:
+            return -1
+
+        dist1 = self._depth_below(node, key1)
+        dist2 = self._depth_below(node, key2)
+        if dist1 < 0 or dist2 < 0:
+            return -1
+        return dist1 + dist2
+
+    def _is_keyed(self, node):
+        """
+        True if the node is the one found by its key,
+        so that the key-guided methods can stand in for the node.
+        """
+        # Not lookup(), which changes the shape of a splay tree.
+        return self._lookup(self._root, node.key) is node
+
     def get_nearest_common_parent(self, node1, node2):
         """
         Return the nearest common parent of the two given nodes.
@@ -497,6 +939,9 @@ class BST(object):
         if node1 is None or node2 is None:
             return None
 
+        if self._is_keyed(node1) and self._is_keyed(node2):
+            return self.lca(node1.key, node2.key)
+
         # Get the path of node 1
         path1 = self.get_node_path(node1)
         if not path1:
@@ -531,6 +976,9 @@ class BST(object):
         if node1 is None or node2 is None:
             return -1
 
+        if self._is_keyed(node1) and self._is_keyed(node2):
+            return self.distance(node1.key, node2.key)
+
         path1 = self.get_node_path(node1)
         if not path1:
             return -1
@@ -552,6 +1000,27 @@ class BST(object):
         dist2 = 0 if i >= len(path2) else len(path2[i:])
         return dist1 + dist2
 
+    def lca_index(self):
+        """
+        Return the LCA index of the tree for O(1) queries,
+        it is rebuilt if the tree has been changed since the last build.
+        """
+        if self._lca_index is None or not self._lca_index.is_valid():
+            self._lca_index = LCAIndex(self)
+        return self._lca_index
+
+    def lca_many(self, pairs):
+        """
+        Return the nearest common parents of a batch of (node1, node2) pairs
+        """
+        return self.lca_index().lca_many(pairs)
+
+    def distance_many(self, pairs):
+        """
+        Return the distances of a batch of (node1, node2) pairs
+        """
+        return self.lca_index().distance_many(pairs)
+
     def get_max_distance(self):
         """
         Return the distance between the two farthest nodes in the tree
@@ -559,10 +1028,7 @@ class BST(object):
         if self._root is None:
             return -1
 
-        # The max breadth is the sum of the max depth of
-        # its left subtree and its right subtree.
-        return (self._get_max_depth(self._root.left) +
-                self._get_max_depth(self._root.right))
+        return self.tree_stats()['diameter']
 
     def get_min_node(self):
         """
@@ -590,46 +1056,349 @@ class BST(object):
 
         return current
 
-    def _inorder_k(self, node, stack, k, c):
-        if node is None or c[0] >= k:
-            return
+    def ceiling(self, key):
+        """
+        Return the first node with key not less than the given key
+        """
+        found = None
+        node = self._root
+        while node is not None:
+            if node.key < key:
+                node = node.right
+            else:
+                found = node
+                node = node.left
+        return found
+
+    def successor(self, key):
+        """
+        Return the first node with key greater than the given key
+        """
+        found = None
+        node = self._root
+        while node is not None:
+            if key < node.key:
+                found = node
+                node = node.left
+            else:
+                node = node.right
+        return found
 
-        self._inorder_k(node.left, stack, k, c)
+    def floor(self, key):
+        """
+        Return the last node with key not greater than the given key
+        """
+        found = None
+        node = self._root
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            else:
+                found = node
+                node = node.right
+        return found
+
+    def predecessor(self, key):
+        """
+        Return the last node with key less than the given key
+        """
+        found = None
+        node = self._root
+        while node is not None:
+            if node.key < key:
+                found = node
+                node = node.right
+            else:
+                node = node.left
+        return found
 
-        c[0] += 1
-        if c[0] == k:
+    def seek(self, key):
+        """
+        Return a cursor at the first node with key not less than
+        the given key, see ceiling().
+        """
+        # Keep the path down, and cut it at the last node found.
+        stack = []
+        depth = 0
+        node = self._root
+        while node is not None:
             stack.append(node)
-            return
+            if not node.key < key:
+                depth = len(stack)
+                node = node.left
+            else:
+                node = node.right
+        del stack[depth:]
+        return Cursor(self, stack)
 
-        self._inorder_k(node.right, stack, k, c)
+    def first(self):
+        """
+        Return a cursor at the node with minimum key value
+        """
+        stack = []
+        node = self._root
+        while node is not None:
+            stack.append(node)
+            node = node.left
+        return Cursor(self, stack)
+
+    def last(self):
+        """
+        Return a cursor at the node with maximum key value
+        """
+        stack = []
+        node = self._root
+        while node is not None:
+            stack.append(node)
+            node = node.right
+        return Cursor(self, stack)
 
     def get_kth_smallest_node(self, k):
         """
         Return the kth smallest node.
         """
-        c = [0]  # A counter
-        stack = []  # A stack to save the target
-        self._inorder_k(self._root, stack, k, c)
-        return stack[0] if len(stack) else None
+        if k < 1 or k > len(self):
+            return None
 
-    def _reserve_inorder_k(self, node, stack, k, c):
-        if node is None or c[0] >= k:
-            return
+        # Descend by the subtree sizes,
+        # k is the order of the target in the current subtree.
+        node = self._root
+        while True:
+            left_size = self._size(node.left)
+            if k <= left_size:
+                node = node.left
+            elif k <= left_size + node.count:
+                return node
+            else:
+                k -= left_size + node.count
+                node = node.right
 
-        self._reserve_inorder_k(node.right, stack, k, c)
+    def get_kth_largest_node(self, k):
+        """
+        Return the kth largest node.
+        """
+        return self.get_kth_smallest_node(len(self) - k + 1)
 
-        c[0] += 1
-        if c[0] == k:
-            stack.append(node)
-            return
+    def _count_below(self, key, inclusive=False):
+        """
+        Return the number of keys less than (or equal to) the given key.
+        """
+        r = 0
+        node = self._root
+        while node is not None:
+            if key < node.key or (key == node.key and not inclusive):
+                node = node.left
+            else:
+                # The node and its left subtree are all below the key.
+                r += self._size(node.left) + node.count
+                node = node.right
 
-        self._reserve_inorder_k(node.left, stack, k, c)
+        return r
 
-    def get_kth_largest_node(self, k):
-        c = [0]  # A counter
-        stack = []  # A stack to save the target
-        self._reserve_inorder_k(self._root, stack, k, c)
-        return stack[0] if len(stack) else None
+    def rank(self, key):
+        """
+        Return the number of keys less than the given key.
+        """
+        return self._count_below(key)
+
+    def range(self, lo, hi, inclusive=False):
+        """
+        Yield the nodes with keys in [lo, hi) in ascending order,
+        or in [lo, hi] if inclusive.
+        """
+        # Descend to lo, stacking the nodes not less than lo,
+        # which are the ones to visit in order afterwards.
+        version = self._mod_count
+        stack = []
+        node = self._root
+        while node is not None:
+            if node.key < lo:
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+
+        while stack:
+            node = stack.pop()
+            if hi < node.key or (hi == node.key and not inclusive):
+                return
+            yield node
+            self._check_version(version)
+
+            # Then the right subtree, from its leftmost node.
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+    def count_range(self, lo, hi, inclusive=False):
+        """
+        Return the number of keys in [lo, hi), or in [lo, hi] if inclusive.
+        """
+        return max(0, self._count_below(hi, inclusive) - self._count_below(lo))
+
+    def _split(self, node, key, inclusive=False):
+        """
+        Split the subtree by key into two, return the roots of
+        the one with keys less than key (or equal to, if inclusive)
+        and the one with the rest.
+        Only the nodes on the search path of key are relinked.
+        """
+        left = right = None
+        # The last node of each side, where the next one is hung on.
+        left_tail = right_tail = None
+        path = []
+
+        while node is not None:
+            path.append(node)
+            if node.key < key or (node.key == key and inclusive):
+                # The node and its left subtree go to the left side.
+                if left_tail is None:
+                    left = node
+                else:
+                    left_tail.right = node
+                node.parent = left_tail
+                left_tail = node
+                node = node.right
+            else:
+                # The node and its right subtree go to the right side.
+                if right_tail is None:
+                    right = node
+                else:
+                    right_tail.left = node
+                node.parent = right_tail
+                right_tail = node
+                node = node.left
+
+        if left_tail is not None:
+            left_tail.right = None
+        if right_tail is not None:
+            right_tail.left = None
+
+        # Refresh the relinked nodes from the bottom up.
+        for node in reversed(path):
+            self._update_node(node)
+
+        return left, right
+
+    def _concat(self, left, right):
+        """
+        Concatenate two subtrees, all keys in left are less than
+        those in right, return the root of the result.
+        """
+        if left is None:
+            return right
+        if right is None:
+            return left
+
+        # Hang the right subtree on the max node of the left subtree.
+        node = left
+        while node.right is not None:
+            node = node.right
+        node.right = right
+        right.parent = node
+
+        # Refresh the right spine of left from the bottom up.
+        while node is not None:
+            self._update_node(node)
+            node = node.parent
+
+        return left
+
+    def delete_range(self, lo, hi, inclusive=False):
+        """
+        Remove all the nodes with keys in [lo, hi),
+        or in [lo, hi] if inclusive, return the number of removed keys.
+        """
+        if not self.count_range(lo, hi, inclusive):
+            return 0
+
+        self._mod_count += 1
+
+        num = len(self)
+
+        # Cut off the keys below lo, then the keys above hi,
+        # and put the two outer parts back together.
+        left, rest = self._split(self._root, lo)
+        _, right = self._split(rest, hi, inclusive)
+        self._root = self._concat(left, right)
+
+        return num - len(self)
+
+    def _probe_groups(self, other, swap=False):
+        """
+        Yield (key, list of data in self, list of data in other)
+        for the keys of self, each looked up in other.
+        The two lists are swapped if required.
+        """
+        for key, datas in _key_groups(self.iter_inorder()):
+            found = [node.data
+                     for node in other.range(key, key, inclusive=True)
+                     for _ in xrange(node.count)]
+            yield (key, found, datas) if swap else (key, datas, found)
+
+    def _combine(self, other, combine, keys='all'):
+        """
+        Build a new tree from self and other, combine(datas1, datas2)
+        returns the list of data to keep for every key.
+        Only the keys of both (keys='both'), or of self (keys='self'),
+        may be kept, and then a much smaller tree is looked up in the
+        other, instead of sweeping both in O(n + m).
+        """
+        n = len(self)
+        m = len(other)
+
+        # Descending for every key costs about m * log2(n),
+        # see lookup_many().
+        if keys in ('both', 'self') and n * m.bit_length() < m:
+            triples = self._probe_groups(other)
+        elif keys == 'both' and m * n.bit_length() < n:
+            triples = other._probe_groups(self, swap=True)
+        else:
+            triples = _merge_groups(_key_groups(self.iter_inorder()),
+                                    _key_groups(other.iter_inorder()))
+
+        items = [(key, data)
+                 for key, datas1, datas2 in triples
+                 for data in combine(datas1, datas2)]
+        return self.__class__.from_sorted(items, multiset=self._multiset)
+
+    def union(self, other):
+        """
+        Return a new tree with the keys in either tree,
+        the data in self is taken for the keys in both.
+        A key in both is counted as many times as in the tree
+        it appears more in.
+        """
+        return self._combine(
+            other, lambda datas1, datas2: datas1 + datas2[len(datas1):])
+
+    def intersection(self, other):
+        """
+        Return a new tree with the keys in both trees, with the data in self.
+        A key is counted as many times as in the tree it appears less in.
+        """
+        return self._combine(
+            other, lambda datas1, datas2: datas1[:len(datas2)], keys='both')
+
+    def difference(self, other):
+        """
+        Return a new tree with the keys in self but not in other,
+        a key is counted as many times as more in self than in other.
+        """
+        return self._combine(
+            other, lambda datas1, datas2: datas1[len(datas2):], keys='self')
+
+    def merge_with(self, other, fn):
+        """
+        Return a new tree with the keys in either tree,
+        the data of a key in both is fn(data in self, data in other).
+        """
+        def combine(datas1, datas2):
+            merged = [fn(data1, data2) for data1, data2 in zip(datas1, datas2)]
+            return merged + datas1[len(merged):] + datas2[len(merged):]
+
+        return self._combine(other, combine)
 
 
 def traverse_helper(bst):
@@ -640,15 +1409,16 @@ def traverse_helper(bst):
 
 
 def show_attr_helper(bst):
+    stats = bst.tree_stats()
     print "Is the BST valid?      %s" % bst.is_valid()
-    print "Is the BST balanced?   %s" % bst.is_balanced()
-    print "Is the BST full?       %s" % bst.is_full()
-    print "Is the BST complete?   %s" % bst.is_complete()
-    print "Is the BST perfect?    %s" % bst.is_perfect()
-    print "The BST node num:      %s" % bst.get_num_of_node()
-    print "The BST leaf node num: %s" % bst.get_num_of_leaf_node()
-    print "The BST max depth:     %s" % bst.get_max_depth()
-    print "The BST max breadth:   %s" % bst.get_max_distance()
+    print "Is the BST balanced?   %s" % stats['balanced']
+    print "Is the BST full?       %s" % stats['full']
+    print "Is the BST complete?   %s" % stats['complete']
+    print "Is the BST perfect?    %s" % stats['perfect']
+    print "The BST node num:      %s" % stats['nodes']
+    print "The BST leaf node num: %s" % stats['leaves']
+    print "The BST max depth:     %s" % stats['height']
+    print "The BST max breadth:   %s" % (stats['diameter'] if bst.root else -1)
     print "The BST min node:      %s" % bst.get_min_node()
     print "The BST max node:      %s" % bst.get_max_node()
 
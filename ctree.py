@@ -0,0 +1,217 @@
+#!/usr/bin/python
+
+"""
+Concurrent Tree wraps a BST (or any subclass of it) for multi-threading.
+The lookups take a shared read lock and never block each other,
+the changes take an exclusive write lock.
+The nodes are returned as detached copies, which the later changes
+of the tree do not touch.
+
+On CPython the GIL lets only one thread run the tree code at a time,
+so the shared reads do not add throughput: a lookup pays for two
+short critical sections (taking and releasing the read lock) where
+a plain global lock pays for one, and the wrapper is slower than
+a global lock (see benchmark/ctree_threads.py). It pays off when
+the reads wait on something else, or with no GIL.
+
+Xiaowen Wang
+"""
+
+import threading
+from contextlib import contextmanager
+
+from node import BinaryNode
+
+
+class RWLock(object):
+    """
+    Reader-Writer Lock:
+    any number of readers, or one writer at a time.
+    A waiting writer stops new readers from coming in,
+    so that the writers are not starved.
+    The lock is not reentrant: a thread holding it must not take it again.
+    """
+
+    def __init__(self, exclusive=False):
+        # The mutex guards the counts below, the condition on it is
+        # only waited on when the lock cannot be taken at once.
+        self._mutex = threading.Lock()
+        self._cond = threading.Condition(self._mutex)
+        self._readers = 0  # Number of readers holding the lock
+        self._writer = False  # Is a writer holding the lock?
+        self._writers_waiting = 0
+
+        if exclusive:
+            # The reads change the data too, so they lock it like writes.
+            self.acquire_read = self.acquire_write
+            self.release_read = self.release_write
+
+    def acquire_read(self):
+        with self._mutex:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._mutex:
+            self._readers -= 1
+            # Only a waiting writer cares about the last reader leaving.
+            if self._readers == 0 and self._writers_waiting:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._mutex:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._mutex:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def _copy_node(node):
+    """
+    Return a detached copy of the key, data and count of the node.
+    A writer may change the tree nodes in place after the read lock
+    is released (e.g. a delete moves the key of the successor into
+    the node removed), the copies never change.
+    """
+    if node is None:
+        return None
+    copy = BinaryNode(node.key, node.data)
+    copy.count = node.count
+    return copy
+
+
+def _copy_nodes(nodes):
+    return [_copy_node(node) for node in nodes]
+
+
+def _reader(name, copy=None):
+    """
+    Return a method calling the tree method under the read lock.
+    The nodes returned are copied by copy before the lock is released.
+    """
+    def method(self, *args, **kwargs):
+        lock = self._lock
+        lock.acquire_read()
+        try:
+            result = getattr(self._tree, name)(*args, **kwargs)
+            return copy(result) if copy is not None else result
+        finally:
+            lock.release_read()
+
+    method.__name__ = name
+    return method
+
+
+def _writer(name, copy=None):
+    """
+    Return a method calling the tree method under the write lock.
+    The nodes returned are copied by copy before the lock is released.
+    """
+    def method(self, *args, **kwargs):
+        lock = self._lock
+        lock.acquire_write()
+        try:
+            result = getattr(self._tree, name)(*args, **kwargs)
+            return copy(result) if copy is not None else result
+        finally:
+            lock.release_write()
+
+    method.__name__ = name
+    return method
+
+
+class ConcurrentTree(object):
+    """
+    Thread-safe wrapper of a tree
+    """
+
+    def __init__(self, tree):
+        self._tree = tree
+        # The lookups of a self-adjusting tree (e.g. splay tree) change it.
+        self._lock = RWLock(exclusive=getattr(tree, 'mutating_lookups', False))
+
+    @property
+    def lock(self):
+        """
+        The lock, for running several calls on the tree as one.
+        The lock is not reentrant, so the calls in the block go to
+        the wrapped tree, not to this wrapper:
+            with ctree.lock.writing():
+                if ctree.tree.lookup(key) is None:
+                    ctree.tree.insert(key)
+        """
+        return self._lock
+
+    @property
+    def tree(self):
+        return self._tree
+
+    def __len__(self):
+        with self._lock.reading():
+            return len(self._tree)
+
+    # The nodes are handed out as copies (see _copy_node).
+    lookup = _reader('lookup', _copy_node)
+    lookup_many = _reader('lookup_many', _copy_nodes)
+    rank = _reader('rank')
+    count_range = _reader('count_range')
+    get_kth_smallest_node = _reader('get_kth_smallest_node', _copy_node)
+    get_kth_largest_node = _reader('get_kth_largest_node', _copy_node)
+    get_min_node = _reader('get_min_node', _copy_node)
+    get_max_node = _reader('get_max_node', _copy_node)
+    floor = _reader('floor', _copy_node)
+    ceiling = _reader('ceiling', _copy_node)
+    successor = _reader('successor', _copy_node)
+    predecessor = _reader('predecessor', _copy_node)
+    range = _reader('range', _copy_nodes)
+
+    insert = _writer('insert', _copy_node)
+    delete = _writer('delete')
+    delete_range = _writer('delete_range')
+
+
+if __name__ == "__main__":
+
+    from avl import AVL
+
+    print "Creating a concurrent AVL tree..."
+    ctree = ConcurrentTree(AVL())
+
+    def write(start):
+        for k in range(start, start + 100):
+            ctree.insert(k)
+
+    threads = [threading.Thread(target=write, args=(i * 100,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print "The tree has %s nodes" % len(ctree)
+    print "Lookup (250): %s" % ctree.lookup(250)
+    print "Is the tree balanced? %s" % ctree.tree.is_balanced()
+
+    exit(0)
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+"""
+Cursor points to a node of a tree, and steps to its neighbours
+in key order in amortized O(1).
+
+The cursor keeps the stack of the ancestors of the node instead of
+following the parent links, so it works on the persistent trees too.
+A cursor is no longer valid once the tree is changed.
+
+Xiaowen Wang
+"""
+
+
+class Cursor(object):
+    """
+    Cursor on a BST (or any subclass of it)
+    """
+
+    def __init__(self, tree, stack):
+        """
+        The stack is the path from root to the node, empty for no node
+        """
+        self._tree = tree
+        self._stack = stack
+        self._version = tree._mod_count
+
+    @property
+    def node(self):
+        """
+        The current node, None if the cursor has run off the tree
+        """
+        return self._stack[-1] if self._stack else None
+
+    @property
+    def key(self):
+        return self._stack[-1].key if self._stack else None
+
+    @property
+    def data(self):
+        return self._stack[-1].data if self._stack else None
+
+    def _check(self):
+        if self._tree._mod_count != self._version:
+            raise RuntimeError("the tree has changed since the cursor was made")
+
+    def next(self):
+        """
+        Step to the next node in key order, return it (None at the end)
+        """
+        self._check()
+        stack = self._stack
+        if not stack:
+            return None
+
+        node = stack[-1].right
+        if node is not None:
+            # The leftmost node of the right subtree
+            while node is not None:
+                stack.append(node)
+                node = node.left
+        else:
+            # Climb up while coming from a right child,
+            # the first parent reached from its left is the next.
+            child = stack.pop()
+            while stack and stack[-1].right is child:
+                child = stack.pop()
+
+        return self.node
+
+    def prev(self):
+        """
+        Step to the previous node in key order, return it (None at the start)
+        """
+        self._check()
+        stack = self._stack
+        if not stack:
+            return None
+
+        # The mirror of next()
+        node = stack[-1].left
+        if node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.right
+        else:
+            child = stack.pop()
+            while stack and stack[-1].left is child:
+                child = stack.pop()
+
+        return self.node
+
+
+if __name__ == "__main__":
+
+    from avl import AVL
+
+    print "Creating an AVL tree..."
+    avl = AVL()
+    for k in [50, 30, 20, 40, 70, 60, 80]:
+        avl.insert(k)
+
+    print "Seeking (45)..."
+    cursor = avl.seek(45)
+    print "At:       %s" % cursor.node
+    print "Next:     %s" % cursor.next()
+    print "Next:     %s" % cursor.next()
+    print "Previous: %s" % cursor.prev()
+
+    print "Scanning backward from the last node..."
+    cursor = avl.last()
+    keys = []
+    while cursor.node is not None:
+        keys.append(cursor.key)
+        cursor.prev()
+    print keys
+
+    print "Floor (45): %s, ceiling (45): %s" % (avl.floor(45), avl.ceiling(45))
+    print "Successor (50): %s, predecessor (50): %s" % (
+        avl.successor(50), avl.predecessor(50))
+
+    exit(0)
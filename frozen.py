@@ -0,0 +1,289 @@
+#!/usr/bin/python
+
+"""
+Frozen BST is a read-only binary searching tree stored in arrays.
+The keys are laid out in the Eytzinger (breadth first) order of
+a complete binary tree: the root is at index 1, and the children of
+index k are at 2k and 2k + 1. No node object or pointer is needed,
+and a lookup runs down one contiguous array.
+
+Xiaowen Wang
+"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bst import _prepare_pairs
+from node import NodeBase
+
+
+def _key_array(keys):
+    """
+    Return the keys in a typed array if they are all numbers,
+    otherwise in a list.
+    """
+    if all(isinstance(k, (int, long)) for k in keys):
+        try:
+            return array('l', keys)
+        except OverflowError:
+            pass
+
+    # Only when all are floats: the ints would come back as floats,
+    # and the big ones would lose precision.
+    if all(isinstance(k, float) for k in keys):
+        return array('d', keys)
+
+    return list(keys)
+
+
+class FrozenBST(object):
+    """
+    Frozen (read-only) Binary Searching Tree
+    """
+
+    def __init__(self, pairs=()):
+        """
+        Build from (key, data) pairs sorted by key
+        """
+        pairs = list(pairs)
+        n = len(pairs)
+
+        # The in-order position of every index of the complete tree,
+        # found by an in-order walk over the indices.
+        order = array('l', [0]) * n
+        stack = []
+        i = 0
+        k = 1
+        while stack or k <= n:
+            if k <= n:
+                stack.append(k)
+                k *= 2
+            else:
+                k = stack.pop()
+                order[i] = k
+                i += 1
+                k = 2 * k + 1
+
+        # Index 0 is not used, so that the index arithmetic stays simple.
+        keys = [None] * (n + 1)
+        data = [None] * (n + 1)
+        for i, (key, value) in enumerate(pairs):
+            keys[order[i]] = key
+            data[order[i]] = value
+        keys[0] = keys[1] if n else 0
+
+        self._n = n
+        self._keys = _key_array(keys)
+        self._data = data
+        self._order = order  # Maps the rank to the index
+        self._sorted_keys = None  # The NumPy array of sorted keys, on demand
+
+    @classmethod
+    def from_sorted(cls, items, duplicates='keep'):
+        """
+        Build from (key, data) pairs,
+        see _prepare_pairs() for the duplicates options.
+        """
+        return cls(_prepare_pairs(items, duplicates))
+
+    @classmethod
+    def from_tree(cls, tree):
+        """
+        Build from a BST (or any subclass of it),
+        the keys counted more than once in a multiset are repeated.
+        """
+        return cls((node.key, node.data)
+                   for node in tree.iter_inorder()
+                   for _ in xrange(node.count))
+
+    def __len__(self):
+        return self._n
+
+    def _node(self, k):
+        return NodeBase(self._keys[k], self._data[k])
+
+    def lookup(self, key):
+        """
+        Search a data in the tree
+        """
+        keys = self._keys
+        n = self._n
+        k = 1
+        while k <= n:
+            current = keys[k]
+            if key == current:
+                return NodeBase(current, self._data[k])
+            # Go to the right child if the current key is less.
+            k = 2 * k + (current < key)
+
+        return None
+
+    def lookup_many(self, keys):
+        """
+        Search a batch of keys,
+        return the nodes (None if not found) in the order of keys.
+        """
+        keys = list(keys)
+
+        if np is not None and isinstance(self._keys, array) and self._n:
+            queries = np.asarray(keys)
+            if queries.dtype.kind in 'iuf':
+                return self._lookup_many_np(queries)
+
+        lookup = self.lookup
+        return [lookup(key) for key in keys]
+
+    def _lookup_many_np(self, queries):
+        """
+        Search a batch of numeric keys by NumPy searchsorted
+        """
+        if self._sorted_keys is None:
+            order = np.asarray(self._order, dtype=np.intp)
+            self._sorted_keys = np.asarray(self._keys)[order]
+
+        sorted_keys = self._sorted_keys
+        ranks = np.searchsorted(sorted_keys, queries)
+        found = sorted_keys[np.minimum(ranks, self._n - 1)] == queries
+        found &= ranks < self._n
+
+        order = self._order
+        node = self._node
+        return [node(order[r]) if hit else None
+                for r, hit in zip(ranks.tolist(), found.tolist())]
+
+    def _lower_bound(self, key):
+        """
+        Return the index of the first key not less than the given key,
+        0 if none.
+        """
+        keys = self._keys
+        n = self._n
+        k = 1
+        while k <= n:
+            k = 2 * k + (keys[k] < key)
+
+        # The bits of k record the turns, 1 for right and 0 for left.
+        # The answer is where the last left turn was taken, so drop
+        # the trailing right turns and that left turn.
+        return k >> ((~k) & (k + 1)).bit_length()
+
+    def _next(self, k):
+        """
+        Return the index of the in-order successor of index k, 0 if none.
+        """
+        # The leftmost node of the right subtree, if there is.
+        if 2 * k + 1 <= self._n:
+            k = 2 * k + 1
+            while 2 * k <= self._n:
+                k *= 2
+            return k
+
+        # Otherwise climb up while being a right child,
+        # the parent of the first left child is the successor.
+        while k & 1:
+            k >>= 1
+        return k >> 1
+
+    def iter_inorder(self):
+        """
+        Yield the nodes in an in-order manner (ascending keys)
+        """
+        for k in self._order:
+            yield self._node(k)
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    def range(self, lo, hi, inclusive=False):
+        """
+        Yield the nodes with keys in [lo, hi) in ascending order,
+        or in [lo, hi] if inclusive.
+        """
+        keys = self._keys
+        k = self._lower_bound(lo)
+        while k:
+            key = keys[k]
+            if hi < key or (hi == key and not inclusive):
+                return
+            yield NodeBase(key, self._data[k])
+            k = self._next(k)
+
+    def _count_below(self, key, inclusive=False):
+        """
+        Return the number of keys less than (or equal to) the given key.
+        """
+        # Binary search over the ranks.
+        keys = self._keys
+        order = self._order
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) / 2
+            current = keys[order[mid]]
+            if current < key or (current == key and inclusive):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rank(self, key):
+        """
+        Return the number of keys less than the given key.
+        """
+        return self._count_below(key)
+
+    def count_range(self, lo, hi, inclusive=False):
+        """
+        Return the number of keys in [lo, hi), or in [lo, hi] if inclusive.
+        """
+        return max(0, self._count_below(hi, inclusive) - self._count_below(lo))
+
+    def get_kth_smallest_node(self, k):
+        """
+        Return the kth smallest node.
+        """
+        if k < 1 or k > self._n:
+            return None
+        return self._node(self._order[k - 1])
+
+    def get_kth_largest_node(self, k):
+        """
+        Return the kth largest node.
+        """
+        return self.get_kth_smallest_node(self._n - k + 1)
+
+    def get_min_node(self):
+        """
+        Return the node with minimum key value
+        """
+        return self.get_kth_smallest_node(1)
+
+    def get_max_node(self):
+        """
+        Return the node with maximum key value
+        """
+        return self.get_kth_smallest_node(self._n)
+
+
+if __name__ == "__main__":
+
+    from avl import AVL
+
+    print "Creating an AVL tree..."
+    avl = AVL()
+    for k in [50, 30, 20, 40, 70, 60, 80]:
+        avl.insert(k, k * 10)
+
+    print "Freezing the tree..."
+    fbst = FrozenBST.from_tree(avl)
+
+    print "Lookup (40): %s" % fbst.lookup(40)
+    print "Lookup (45): %s" % fbst.lookup(45)
+    print "Range [30, 70): %s" % [str(n) for n in fbst.range(30, 70)]
+    print "The %sth smallest node: %s" % (3, fbst.get_kth_smallest_node(3))
+    print "The %sth largest node: %s" % (3, fbst.get_kth_largest_node(3))
+
+    exit(0)
@@ -0,0 +1,470 @@
+#!/usr/bin/python
+
+"""
+Instrumentation of the trees, heaps and tries.
+
+instrument(obj) swaps the class of obj for an instrumented subclass,
+which counts the work done on the hot paths and records the latency
+of every operation; uninstrument(obj) swaps the class back.
+The plain classes are never changed, so nothing is paid
+while the instrumentation is off.
+
+The counters are:
+    comparisons    - key comparisons
+    nodes_visited  - nodes reached on the search paths
+    rotations      - tree rotations
+    rebalances     - AVL subtree balancing calls which rotate
+    swaps          - heap node swaps
+and the latencies are kept per operation in histograms of
+power-of-2 microsecond buckets: bucket 0 counts the operations
+under 1us, bucket b those in [2^(b-1), 2^b) us.
+
+The counters are not guarded by a lock, so the numbers of a tree
+shared by threads (see ctree.py) are only approximate.
+The counting goes through the methods of the plain classes:
+the keys searched are wrapped to count their comparisons, and
+an instrumented heap or trie puts counting stand-ins in place of
+its node list or root while an operation runs, so it must not be
+read by other threads at the same time.
+
+Xiaowen Wang
+"""
+
+import time
+
+from bh import MinHeap
+from bst import BST
+from trie import Trie
+
+timer = time.time
+
+NUM_BUCKETS = 32
+
+COUNTERS = ('comparisons', 'nodes_visited', 'rotations', 'rebalances', 'swaps')
+
+
+class Stats(object):
+    """
+    The counters and latency histograms of one instrumented object
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {}  # Maps the operation to its buckets
+        self.totals = {}  # Maps the operation to its total seconds
+
+    def record(self, op, seconds):
+        """
+        Record the latency of one operation
+        """
+        buckets = self.histograms.get(op)
+        if buckets is None:
+            buckets = self.histograms[op] = [0] * NUM_BUCKETS
+            self.totals[op] = 0.0
+        buckets[min(int(seconds * 1e6).bit_length(), NUM_BUCKETS - 1)] += 1
+        self.totals[op] += seconds
+
+    def snapshot(self):
+        """
+        Return a copy of the numbers as plain dicts and lists
+        """
+        latency = {}
+        for op, buckets in self.histograms.items():
+            latency[op] = {
+                'count': sum(buckets),
+                'total_us': self.totals[op] * 1e6,
+                'buckets': list(buckets),
+            }
+        return {'counters': dict(self.counters), 'latency': latency}
+
+
+class _CountingKey(object):
+    """
+    Wrap a key to count its comparisons with the node keys,
+    an equality test is taken as a visit to a node.
+    Two wrapped keys (of heap nodes) make one comparison.
+    """
+
+    __slots__ = ('key', 'counters')
+
+    def __init__(self, key, counters):
+        self.key = key
+        self.counters = counters
+
+    def __eq__(self, other):
+        self.counters['comparisons'] += 1
+        self.counters['nodes_visited'] += 1
+        return self.key == other
+
+    def __ne__(self, other):
+        self.counters['comparisons'] += 1
+        self.counters['nodes_visited'] += 1
+        return self.key != other
+
+    def __lt__(self, other):
+        self.counters['comparisons'] += 1
+        if other.__class__ is _CountingKey:
+            other = other.key
+        return self.key < other
+
+    def __gt__(self, other):
+        self.counters['comparisons'] += 1
+        if other.__class__ is _CountingKey:
+            other = other.key
+        return self.key > other
+
+    def __le__(self, other):
+        self.counters['comparisons'] += 1
+        if other.__class__ is _CountingKey:
+            other = other.key
+        return self.key <= other
+
+    def __ge__(self, other):
+        self.counters['comparisons'] += 1
+        if other.__class__ is _CountingKey:
+            other = other.key
+        return self.key >= other
+
+    __hash__ = None
+
+
+class _CountingHeapNode(object):
+    """
+    A heap node handed out by _CountingVec, with a counting key
+    """
+
+    __slots__ = ('node', 'key')
+
+    def __init__(self, node, counters):
+        self.node = node
+        self.key = _CountingKey(node.key, counters)
+
+
+class _CountingVec(object):
+    """
+    Stand in for the node list of a heap while it percolates a node,
+    counting the nodes written back into the list
+    """
+
+    __slots__ = ('vec', 'counters', 'writes')
+
+    def __init__(self, vec, counters):
+        self.vec = vec
+        self.counters = counters
+        self.writes = 0
+
+    def __len__(self):
+        return len(self.vec)
+
+    def __getitem__(self, i):
+        return _CountingHeapNode(self.vec[i], self.counters)
+
+    def __setitem__(self, i, node):
+        self.vec[i] = node.node
+        self.writes += 1
+
+
+class _CountingTrieNode(object):
+    """
+    Stand in for a trie node on a search path, counting the nodes reached
+    """
+
+    __slots__ = ('node', 'counters')
+
+    def __init__(self, node, counters):
+        counters['nodes_visited'] += 1
+        self.node = node
+        self.counters = counters
+
+    @property
+    def is_end(self):
+        return self.node.is_end
+
+    def get_child(self, ch):
+        child = self.node.get_child(ch)
+        if child is None:
+            return None
+        return _CountingTrieNode(child, self.counters)
+
+
+def _timed(op):
+    """
+    Return a method timing the method op of the base class
+    """
+    def method(self, *args, **kwargs):
+        start = timer()
+        try:
+            return getattr(super(self._mixin, self), op)(*args, **kwargs)
+        finally:
+            self._stats.record(op, timer() - start)
+
+    method.__name__ = op
+    return method
+
+
+class _Instrumented(object):
+    """
+    The base of the instrumented classes
+    """
+
+    def __init__(self, *args, **kwargs):
+        # The trees made by the methods of an instrumented tree
+        # (e.g. union, split, snapshot) are instrumented as well.
+        self._stats = Stats()
+        super(_Instrumented, self).__init__(*args, **kwargs)
+
+    def stats(self):
+        """
+        Return a snapshot of the counters and latency histograms
+        """
+        return self._stats.snapshot()
+
+    def reset_stats(self):
+        self._stats.reset()
+
+
+class _TreeMixin(_Instrumented):
+    """
+    Instrumentation of BST and its subclasses
+    """
+
+    insert = _timed('insert')
+    delete = _timed('delete')
+    lookup = _timed('lookup')
+
+    def _new_node(self, key, data):
+        """
+        Override
+        The node gets the key, not its wrapper
+        """
+        if isinstance(key, _CountingKey):
+            key = key.key
+        return super(_TreeMixin, self)._new_node(key, data)
+
+    def _insert(self, node, key, data):
+        """
+        Override
+        Count the comparisons and the nodes down to the new node
+        """
+        counters = self._stats.counters
+        visited = counters['nodes_visited']
+        new_node = super(_TreeMixin, self)._insert(
+            node, _CountingKey(key, counters), data)
+
+        # Every ancestor of the new node has been visited,
+        # the equality tests of a multiset are not counted again.
+        if new_node.count > 1:
+            visited += 1
+        parent = new_node.parent
+        while parent is not None:
+            visited += 1
+            parent = parent.parent
+        counters['nodes_visited'] = visited
+        return new_node
+
+    def _lookup(self, node, key):
+        """
+        Override
+        Count the comparisons and the nodes visited
+        """
+        return super(_TreeMixin, self)._lookup(
+            node, _CountingKey(key, self._stats.counters))
+
+    def _delete(self, node, key, parent=None):
+        """
+        Override
+        Count the comparisons and the nodes visited
+        """
+        return super(_TreeMixin, self)._delete(
+            node, _CountingKey(key, self._stats.counters), parent)
+
+    def _find_min_node(self, node, parent=None):
+        """
+        Override
+        Count the nodes down to the successor
+        """
+        found, found_parent = super(_TreeMixin, self)._find_min_node(node, parent)
+        current = found
+        while current is not node:
+            self._stats.counters['nodes_visited'] += 1
+            current = current.parent
+        return found, found_parent
+
+    def _rotate_left(self, node):
+        self._stats.counters['rotations'] += 1
+        return super(_TreeMixin, self)._rotate_left(node)
+
+    def _rotate_right(self, node):
+        self._stats.counters['rotations'] += 1
+        return super(_TreeMixin, self)._rotate_right(node)
+
+    def _balance_node(self, node):
+        """
+        Override
+        Count the balancing calls which rotate, AVL only
+        """
+        rotations = self._stats.counters['rotations']
+        result = super(_TreeMixin, self)._balance_node(node)
+        if self._stats.counters['rotations'] != rotations:
+            self._stats.counters['rebalances'] += 1
+        return result
+
+
+class _HeapMixin(_Instrumented):
+    """
+    Instrumentation of MinHeap
+    """
+
+    insert = _timed('insert')
+    extract_min = _timed('extract_min')
+    remove = _timed('remove')
+
+    def _percolate(self, name, i):
+        """
+        Run the percolation of MinHeap on a _CountingVec, count the work
+        """
+        vec = self._vec
+        if isinstance(vec, _CountingVec):
+            # A recursive call of _perc_down, counted by the first one
+            return getattr(super(_HeapMixin, self), name)(i)
+
+        counters = self._stats.counters
+        comparisons = counters['comparisons']
+        self._vec = counting = _CountingVec(vec, counters)
+        try:
+            getattr(super(_HeapMixin, self), name)(i)
+        finally:
+            self._vec = vec
+
+        # Each comparison reaches a parent or a child node,
+        # and each swap writes two nodes back.
+        counters['nodes_visited'] += counters['comparisons'] - comparisons
+        counters['swaps'] += counting.writes / 2
+
+    def _perc_up(self, i):
+        """
+        Override
+        Count the comparisons and swaps of MinHeap._perc_up
+        """
+        self._percolate('_perc_up', i)
+
+    def _perc_down(self, i):
+        """
+        Override
+        Count the comparisons and swaps of MinHeap._perc_down
+        """
+        self._percolate('_perc_down', i)
+
+
+class _TrieMixin(_Instrumented):
+    """
+    Instrumentation of Trie
+    """
+
+    delete = _timed('delete')
+
+    def insert(self, key, data=None):
+        """
+        Override
+        Count the nodes on the path of the key
+        """
+        start = timer()
+        try:
+            super(_TrieMixin, self).insert(key, data)
+            self._stats.counters['nodes_visited'] += len(key) + 1
+        finally:
+            self._stats.record('insert', timer() - start)
+
+    def search(self, key):
+        """
+        Override
+        Count the nodes Trie.search reaches from the root
+        """
+        start = timer()
+        root = self._root
+        self._root = _CountingTrieNode(root, self._stats.counters)
+        try:
+            node = super(_TrieMixin, self).search(key)
+            return node.node if node is not None else None
+        finally:
+            self._root = root
+            self._stats.record('search', timer() - start)
+
+
+# The instrumented class of every plain class, made on demand
+_classes = {}
+
+
+def _instrumented_class(cls):
+    """
+    Return the instrumented subclass of cls
+    """
+    if cls not in _classes:
+        for base, mixin in ((BST, _TreeMixin), (MinHeap, _HeapMixin), (Trie, _TrieMixin)):
+            if issubclass(cls, base):
+                break
+        else:
+            raise TypeError("cannot instrument %s" % cls.__name__)
+
+        _classes[cls] = type('Instrumented' + cls.__name__, (mixin, cls),
+                             {'_mixin': mixin, '_plain': cls})
+    return _classes[cls]
+
+
+def instrument(obj):
+    """
+    Turn the instrumentation of obj on, return obj
+    """
+    if isinstance(obj, _Instrumented):
+        return obj
+    obj._stats = Stats()
+    obj.__class__ = _instrumented_class(obj.__class__)
+    return obj
+
+
+def uninstrument(obj):
+    """
+    Turn the instrumentation of obj off, return its last stats
+    """
+    if not isinstance(obj, _Instrumented):
+        return None
+    snapshot = obj.stats()
+    obj.__class__ = obj._plain
+    del obj._stats
+    return snapshot
+
+
+def stats(obj):
+    """
+    Return a snapshot of the stats of obj, None if not instrumented
+    """
+    if not isinstance(obj, _Instrumented):
+        return None
+    return obj.stats()
+
+
+if __name__ == "__main__":
+
+    from avl import AVL
+
+    print "Creating an instrumented AVL tree..."
+    avl = instrument(AVL())
+    for k in range(100):
+        avl.insert(k)
+    for k in range(0, 100, 3):
+        avl.lookup(k)
+    avl.delete(50)
+
+    snapshot = avl.stats()
+    for name in COUNTERS:
+        print "%-14s %d" % (name, snapshot['counters'][name])
+    for op, hist in sorted(snapshot['latency'].items()):
+        print "%-14s %d ops, %.1f us" % (op, hist['count'], hist['total_us'])
+
+    uninstrument(avl)
+    print "Back to %s" % type(avl).__name__
+
+    exit(0)
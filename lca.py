@@ -0,0 +1,173 @@
+#!/usr/bin/python
+
+"""
+LCA Index answers the nearest common parent (lowest common ancestor)
+of two nodes in O(1), after an O(n log n) build.
+
+The tree is walked once in an Euler tour, writing down every node
+each time it is entered or returned to, with its depth.
+The nearest common parent of two nodes is the shallowest node
+in the tour between their first appearances, which is a range minimum
+query answered by a sparse table of the minimums of every
+power-of-2 long range.
+
+The index belongs to one state of the tree: it is rebuilt by the tree
+on the next query after the tree is changed, and an index held
+by the caller raises RuntimeError once the tree is changed.
+
+Xiaowen Wang
+"""
+
+from array import array
+
+
+class LCAIndex(object):
+    """
+    Lowest Common Ancestor Index of a tree
+    """
+
+    def __init__(self, tree):
+        self._tree = tree
+        self._version = tree._mod_count  # The state of the tree indexed
+        self._root = tree.root
+
+        euler = []  # The nodes in the Euler tour
+        depths = array('l')  # The depth of every node in the tour
+        first = {}  # Maps the node to its first position in the tour
+
+        # Each entry is a node, its depth, and the next child to visit:
+        # 0 for the left one, 1 for the right one, 2 for none.
+        stack = [[self._root, 0, 0]] if self._root is not None else []
+        while stack:
+            entry = stack[-1]
+            node, depth, step = entry
+
+            if step == 0:
+                first[node] = len(euler)
+            euler.append(node)
+            depths.append(depth)
+
+            # Go down to the next child, if there is.
+            while step < 2:
+                child = node.left if step == 0 else node.right
+                step += 1
+                if child is not None:
+                    entry[2] = step
+                    stack.append([child, depth + 1, 0])
+                    break
+            else:
+                stack.pop()
+
+        self._euler = euler
+        self._depths = depths
+        self._first = first
+
+        # table[j][i] is the position of the shallowest node
+        # in the tour range [i, i + 2^j).
+        m = len(euler)
+        table = [array('l', xrange(m))]
+        j = 1
+        while (1 << j) <= m:
+            prev = table[-1]
+            half = 1 << (j - 1)
+            level = array('l', prev[:m - (1 << j) + 1])
+            for i in xrange(len(level)):
+                b = prev[i + half]
+                if depths[b] < depths[level[i]]:
+                    level[i] = b
+            table.append(level)
+            j += 1
+        self._table = table
+
+    def is_valid(self):
+        """
+        True if the tree has not been changed since the index was built
+        """
+        return (self._tree._mod_count == self._version and
+                self._tree.root is self._root)
+
+    def _min_pos(self, i, j):
+        """
+        Return the position of the shallowest node in the tour range [i, j]
+        """
+        if i > j:
+            i, j = j, i
+        k = (j - i + 1).bit_length() - 1
+        a = self._table[k][i]
+        b = self._table[k][j - (1 << k) + 1]
+        return b if self._depths[b] < self._depths[a] else a
+
+    def _check(self):
+        if not self.is_valid():
+            raise RuntimeError("the tree has changed since the index was built")
+
+    def _lca(self, node1, node2):
+        first = self._first
+        if node1 not in first or node2 not in first:
+            return None
+        return self._euler[self._min_pos(first[node1], first[node2])]
+
+    def _distance(self, node1, node2):
+        first = self._first
+        if node1 not in first or node2 not in first:
+            return -1
+        i = first[node1]
+        j = first[node2]
+        depths = self._depths
+        return depths[i] + depths[j] - 2 * depths[self._min_pos(i, j)]
+
+    def lca(self, node1, node2):
+        """
+        Return the nearest common parent of the two given nodes,
+        None if any of them is not in the tree.
+        """
+        self._check()
+        return self._lca(node1, node2)
+
+    def distance(self, node1, node2):
+        """
+        Return the distance between the two given nodes,
+        -1 if any of them is not in the tree.
+        """
+        self._check()
+        return self._distance(node1, node2)
+
+    def lca_many(self, pairs):
+        """
+        Return the nearest common parents of the (node1, node2) pairs
+        """
+        self._check()
+        lca = self._lca
+        return [lca(node1, node2) for node1, node2 in pairs]
+
+    def distance_many(self, pairs):
+        """
+        Return the distances of the (node1, node2) pairs
+        """
+        self._check()
+        distance = self._distance
+        return [distance(node1, node2) for node1, node2 in pairs]
+
+
+if __name__ == "__main__":
+
+    from avl import AVL
+
+    print "Creating an AVL tree..."
+    avl = AVL()
+    nodes = dict((k, avl.insert(k)) for k in [50, 30, 20, 40, 70, 60, 80, 10])
+
+    print "Building the LCA index..."
+    index = LCAIndex(avl)
+
+    pairs = [(nodes[10], nodes[40]), (nodes[20], nodes[80]), (nodes[60], nodes[60])]
+    for (n1, n2), parent, dist in zip(pairs, index.lca_many(pairs),
+                                      index.distance_many(pairs)):
+        print "Node (%s & %s): common parent %s, distance %s" % (
+            n1.key, n2.key, parent, dist)
+
+    print "Inserting node (90)..."
+    avl.insert(90)
+    print "Is the index still valid? %s" % index.is_valid()
+
+    exit(0)
@@ -12,6 +12,8 @@ class NodeBase(object):
     Node Base Class
     """
 
+    __slots__ = ('key', 'data')
+
     def __init__(self, key, data=None):
         self.key = key
         self.data = data
@@ -28,20 +30,51 @@ class BinaryNode(NodeBase):
     Binary Tree Node
     """
 
+    __slots__ = ('left', 'right', 'parent', 'size', 'count')
+
     def __init__(self, key, data=None):
         super(BinaryNode, self).__init__(key, data)
         self.left = None
         self.right = None
+        self.parent = None  # Points back to the parent node
+        self.size = 1  # Number of keys in the subtree rooted at this node
+        self.count = 1  # Number of the key, more than 1 only in multiset mode
 
     def is_leaf(self):
         return self.left is None and self.right is None
 
 
+class AVLNode(BinaryNode):
+    """
+    AVL Tree Node
+    """
+
+    __slots__ = ('height',)
+
+    def __init__(self, key, data=None):
+        super(AVLNode, self).__init__(key, data)
+        self.height = 1  # Height of the subtree rooted at this node
+
+
+class PersistentAVLNode(AVLNode):
+    """
+    Persistent AVL Tree Node
+    """
+
+    __slots__ = ('owner',)
+
+    def __init__(self, key, data=None):
+        super(PersistentAVLNode, self).__init__(key, data)
+        self.owner = None  # The tree version allowed to change it in place
+
+
 class RedBlackNode(BinaryNode):
     """
     Red-Black Tree Node
     """
 
+    __slots__ = ('is_red',)
+
     def __init__(self, key, data=None):
         super(RedBlackNode, self).__init__(key, data)
         self.is_red = False  # Red or black?
@@ -52,14 +85,18 @@ class HeapNode(NodeBase):
     Binary Heap Node
     """
 
+    __slots__ = ()
+
 
 class TrieNode(object):
     """
     Trie Tree Node
     """
 
+    __slots__ = ('children', 'is_end', 'data')
+
     def __init__(self):
-        self.children = {}  # Points to children nodes
+        self.children = None  # Points to children nodes, allocated on demand
         self.is_end = False  # Is the end of a word/key?
         self.data = None  # Can store some extra content
 
@@ -70,6 +107,35 @@ class TrieNode(object):
         """
         return not self.children
 
+    def get_child(self, ch):
+        """
+        Return the child node of the character, None if there is not.
+        """
+        if self.children is None:
+            return None
+        return self.children.get(ch)
+
+    def add_child(self, ch):
+        """
+        Return the child node of the character, create it if there is not.
+        """
+        if self.children is None:
+            self.children = {}
+
+        node = self.children.get(ch)
+        if node is None:
+            node = self.children[ch] = TrieNode()
+        return node
+
+    def remove_child(self, ch):
+        """
+        Remove the child node of the character,
+        the children dict is released once it gets empty.
+        """
+        del self.children[ch]
+        if not self.children:
+            self.children = None
+
     def is_free(self):
         """
         True if the node is free to be deleted.
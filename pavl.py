@@ -0,0 +1,253 @@
+#!/usr/bin/python
+
+"""
+Persistent AVL Tree keeps the old versions of the tree valid
+while the tree is being changed, by path copying.
+
+Every node records the tree version (owner) allowed to change it in place.
+snapshot() hands out a new version sharing all the nodes in O(1),
+and from then on neither side owns any shared node.
+Before insert or delete changes a shared node, the node is copied,
+so only the O(log n) nodes on the search path
+(and the few ones touched by rotations) are copied.
+The same goes for split, join and delete_range, which copy the shared
+nodes on the split path and on the spines they hang subtrees on.
+The trees they move nodes into own none of them,
+so the nodes are copied again before being changed there.
+
+The parent links of the shared nodes may point into another version,
+so they are never followed: the parent of a node is found by
+searching down from root.
+
+Xiaowen Wang
+"""
+
+from avl import AVL
+from node import PersistentAVLNode
+
+
+class PersistentAVL(AVL):
+    """
+    Persistent AVL Tree
+    """
+
+    _node_class = PersistentAVLNode
+
+    def __init__(self, multiset=False):
+        super(PersistentAVL, self).__init__(multiset)
+        self._owner = object()  # The token of this version
+
+    def _new_node(self, key, data):
+        """
+        Override
+        Create a node owned by this version
+        """
+        node = self._node_class(key, data)
+        node.owner = self._owner
+        return node
+
+    def snapshot(self):
+        """
+        Return a snapshot of the tree in O(1).
+        The snapshot is a tree of its own, and the changes made to
+        either one are not seen by the other.
+        """
+        snap = self.__class__(self._multiset)
+        snap._root = self._root
+
+        # All the current nodes are shared from now on.
+        self._owner = object()
+        return snap
+
+    def _own(self, node, parent):
+        """
+        Return the node if it is owned by this version,
+        otherwise replace it under parent (or as root)
+        by an owned copy and return the copy.
+        """
+        if node is None or node.owner is self._owner:
+            return node
+
+        # Copy all the fields of the node.
+        copy = self._new_node(node.key, node.data)
+        for cls in type(node).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name != 'owner':
+                    setattr(copy, name, getattr(node, name))
+
+        copy.parent = parent
+        if parent is None:
+            self._root = copy
+        elif parent.left is node:
+            parent.left = copy
+        else:
+            parent.right = copy
+
+        if copy.left is not None:
+            copy.left.parent = copy
+        if copy.right is not None:
+            copy.right.parent = copy
+
+        return copy
+
+    def _own_path(self, key, to_successor=False):
+        """
+        Own all the nodes on the search path of key.
+        The path stops at the node of key for a delete, or in multiset
+        mode where the key is only counted; for a delete, it goes on
+        to the successor if the node of key has two children.
+        """
+        parent = None
+        node = self._root
+        while node is not None:
+            node = self._own(node, parent)
+            parent = node
+
+            if key == node.key and (to_successor or self._multiset):
+                if not to_successor or node.left is None or node.right is None:
+                    return
+                # The leftmost node of the right subtree is the successor.
+                node = self._own(node.right, node)
+                while node.left is not None:
+                    node = self._own(node.left, node)
+                return
+
+            if key < node.key:
+                node = node.left
+            else:
+                node = node.right
+
+    def _balance_node(self, node):
+        """
+        Override
+        Own the nodes to rotate before balancing the subtree,
+        the given node is already owned.
+        """
+        bal = self._get_balance(node)
+
+        if bal > 1:
+            left = self._own(node.left, node)
+            if self._get_balance(left) < 0:
+                self._own(left.right, left)
+
+        elif bal < -1:
+            right = self._own(node.right, node)
+            if self._get_balance(right) > 0:
+                self._own(right.left, right)
+
+        return super(PersistentAVL, self)._balance_node(node)
+
+    def insert(self, key, data=None):
+        """
+        Override
+        Insert a node to the tree, copying the shared nodes on the way
+        """
+        self._own_path(key)
+        return super(PersistentAVL, self).insert(key, data)
+
+    def delete(self, key):
+        """
+        Override
+        Remove a node from the tree, copying the shared nodes on the way
+        """
+        node = self._lookup(self._root, key)
+        if node is None:
+            # Nothing to remove, the nodes stay shared.
+            return
+
+        # A key counted more than once only loses a count, the node stays.
+        self._own_path(key, to_successor=not (self._multiset and node.count > 1))
+        super(PersistentAVL, self).delete(key)
+
+    def _join3(self, left, pivot, right):
+        """
+        Override
+        Own the pivot and the spine of the higher side before joining,
+        the rotations on the way up own their nodes (see _balance_node).
+        """
+        # NOTE: owning the top of a detached subtree sets self._root,
+        # the caller sets it at the end anyway (see AVL._join3).
+        pivot = self._own(pivot, None)
+
+        lh = self._height(left)
+        rh = self._height(right)
+        if lh > rh + 1:
+            node = left = self._own(left, None)
+            while self._height(node.right) > rh + 1:
+                node = self._own(node.right, node)
+        elif rh > lh + 1:
+            node = right = self._own(right, None)
+            while self._height(node.left) > lh + 1:
+                node = self._own(node.left, node)
+
+        return super(PersistentAVL, self)._join3(left, pivot, right)
+
+    def _pop_min(self, node):
+        """
+        Override
+        Own the left spine down to the min node before taking it out
+        """
+        node = top = self._own(node, None)
+        while node.left is not None:
+            node = self._own(node.left, node)
+        return super(PersistentAVL, self)._pop_min(top)
+
+    def get_node_path(self, node):
+        """
+        Override
+        Return the node path list to the given node from root,
+        found by searching down from root.
+        """
+        if node is None:
+            return []
+
+        key = node.key
+        path = []
+        stack = [(self._root, 0)] if self._root is not None else []
+        while stack:
+            current, depth = stack.pop()
+            del path[depth:]
+            path.append(current)
+
+            if current is node:
+                return path
+
+            # The equal keys may be on both sides.
+            if current.left is not None and not current.key < key:
+                stack.append((current.left, depth + 1))
+            if current.right is not None and not key < current.key:
+                stack.append((current.right, depth + 1))
+
+        return []
+
+    def get_parent(self, node):
+        """
+        Override
+        Return the parent node of the given node.
+        """
+        path = self.get_node_path(node)
+        if len(path) >= 2:
+            return path[-2]
+        return None
+
+
+if __name__ == "__main__":
+
+    print "Creating a persistent AVL tree..."
+    pavl = PersistentAVL()
+    for k in [50, 30, 20, 40, 70, 60, 80]:
+        pavl.insert(k)
+
+    print "Taking a snapshot..."
+    snap = pavl.snapshot()
+
+    print "Inserting node (10), removing node (50)..."
+    pavl.insert(10)
+    pavl.delete(50)
+
+    print "The tree:"
+    pavl.print_inorder()
+    print "The snapshot:"
+    snap.print_inorder()
+
+    exit(0)
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+
+"""
+Red-Black Tree is a self-balancing binary search tree.
+1. Every node is either red or black;
+2. The root is black;
+3. A red node does not have a red child;
+4. Every path from a node to its descendant leaves has
+   the same number of black nodes.
+It does at most 2 rotations per insert and 3 per delete.
+
+Xiaowen Wang
+"""
+
+from bst import BST
+from node import RedBlackNode
+
+
+def _is_red(node):
+    """
+    True if the node is red, an empty node is black
+    """
+    return node is not None and node.is_red
+
+
+class RBTree(BST):
+    """
+    Red-Black Tree
+    """
+
+    _node_class = RedBlackNode
+
+    @classmethod
+    def from_sorted(cls, items, duplicates='keep', multiset=False):
+        """
+        Override
+        Build a balanced tree from (key, data) pairs in O(n),
+        then paint it.
+        """
+        tree = super(RBTree, cls).from_sorted(items, duplicates, multiset)
+        tree._paint_balanced()
+        return tree
+
+    def _paint_balanced(self):
+        """
+        Paint a tree linked by _link_balanced(), where all levels
+        but the last one are full: the nodes on the last level are red
+        if it is not full, all the others are black.
+        """
+        h = self.get_max_depth()
+        last_red = self.get_num_of_node() != 2 ** h - 1
+
+        depth = 0
+        level = [self._root] if self._root is not None else []
+        while level:
+            depth += 1
+            next_level = []
+            for node in level:
+                node.is_red = last_red and depth == h
+                if node.left is not None:
+                    next_level.append(node.left)
+                if node.right is not None:
+                    next_level.append(node.right)
+            level = next_level
+
+    def insert(self, key, data=None):
+        """
+        Override
+        Insert a node to the tree, still keeping balanced
+        """
+        new_node = super(RBTree, self).insert(key, data)
+        if new_node.count > 1:
+            # An existing key is counted again, nothing is changed.
+            return new_node
+
+        # A new node is red, then fix the red parent of red node.
+        new_node.is_red = True
+        node = new_node
+
+        while node is not self._root and node.parent.is_red:
+            parent = node.parent
+            # The parent is red so it cannot be the root.
+            grandparent = parent.parent
+
+            if parent is grandparent.left:
+                uncle = grandparent.right
+                if _is_red(uncle):
+                    # Red uncle: push the black down from the grandparent,
+                    # and carry on from the grandparent.
+                    parent.is_red = False
+                    uncle.is_red = False
+                    grandparent.is_red = True
+                    node = grandparent
+                else:
+                    # Black uncle: rotate the node to the outside first,
+                    # then rotate the grandparent.
+                    if node is parent.right:
+                        self._rotate_left(parent)
+                        node, parent = parent, node
+                    parent.is_red = False
+                    grandparent.is_red = True
+                    self._rotate_right(grandparent)
+
+            else:
+                # The mirror of the above
+                uncle = grandparent.left
+                if _is_red(uncle):
+                    parent.is_red = False
+                    uncle.is_red = False
+                    grandparent.is_red = True
+                    node = grandparent
+                else:
+                    if node is parent.left:
+                        self._rotate_right(parent)
+                        node, parent = parent, node
+                    parent.is_red = False
+                    grandparent.is_red = True
+                    self._rotate_left(grandparent)
+
+        self._root.is_red = False
+        return new_node
+
+    def _delete_node_with_child(self, node, child=None, parent=None):
+        """
+        Override
+        To delete the node with one or zero child,
+        then fix the missing black if the node is black.
+        """
+        is_black = not node.is_red
+        super(RBTree, self)._delete_node_with_child(node, child=child, parent=parent)
+
+        if is_black:
+            self._fix_delete(child, parent)
+
+    def _fix_delete(self, node, parent):
+        """
+        The paths through node (which may be empty) are short of one black,
+        fix it up from node toward root.
+        """
+        while node is not self._root and not _is_red(node):
+            if node is parent.left:
+                sibling = parent.right
+
+                if sibling.is_red:
+                    # Red sibling: rotate to get a black one.
+                    sibling.is_red = False
+                    parent.is_red = True
+                    self._rotate_left(parent)
+                    sibling = parent.right
+
+                if not _is_red(sibling.left) and not _is_red(sibling.right):
+                    # Black nephews: take one black off the sibling,
+                    # and move the problem up to the parent.
+                    sibling.is_red = True
+                    node = parent
+                    parent = node.parent
+                else:
+                    # Make the far nephew red, then rotate the parent,
+                    # the sibling takes over the parent's color.
+                    if not _is_red(sibling.right):
+                        sibling.left.is_red = False
+                        sibling.is_red = True
+                        self._rotate_right(sibling)
+                        sibling = parent.right
+                    sibling.is_red = parent.is_red
+                    parent.is_red = False
+                    sibling.right.is_red = False
+                    self._rotate_left(parent)
+                    node = self._root
+
+            else:
+                # The mirror of the above
+                sibling = parent.left
+
+                if sibling.is_red:
+                    sibling.is_red = False
+                    parent.is_red = True
+                    self._rotate_right(parent)
+                    sibling = parent.left
+
+                if not _is_red(sibling.left) and not _is_red(sibling.right):
+                    sibling.is_red = True
+                    node = parent
+                    parent = node.parent
+                else:
+                    if not _is_red(sibling.left):
+                        sibling.right.is_red = False
+                        sibling.is_red = True
+                        self._rotate_left(sibling)
+                        sibling = parent.left
+                    sibling.is_red = parent.is_red
+                    parent.is_red = False
+                    sibling.left.is_red = False
+                    self._rotate_right(parent)
+                    node = self._root
+
+        if node is not None:
+            node.is_red = False
+
+    def delete_range(self, lo, hi, inclusive=False):
+        """
+        Override
+        Remove all the nodes with keys in [lo, hi),
+        or in [lo, hi] if inclusive, return the number of removed keys.
+        A few keys are deleted one by one in O(k log n),
+        otherwise the tree is rebalanced once by relinking
+        the remaining nodes in O(n).
+        """
+        num = self.count_range(lo, hi, inclusive)
+        n = len(self)
+
+        if num * n.bit_length() < n:
+            keys = [(node.key, node.count) for node in self.range(lo, hi, inclusive)]
+            for key, count in keys:
+                for _ in xrange(count):
+                    self.delete(key)
+            return num
+
+        num = super(RBTree, self).delete_range(lo, hi, inclusive)
+
+        if num:
+            nodes = list(self.iter_inorder())
+            self._root = self._link_balanced(nodes, 0, len(nodes))
+            self._paint_balanced()
+
+        return num
+
+    def _is_red_black(self, node):
+        """
+        Return the black height of the subtree,
+        or -1 if it breaks the red-black rules.
+        """
+        if node is None:
+            return 1
+
+        if node.is_red and (_is_red(node.left) or _is_red(node.right)):
+            return -1
+
+        left = self._is_red_black(node.left)
+        right = self._is_red_black(node.right)
+        if left < 0 or left != right:
+            return -1
+
+        return left + (0 if node.is_red else 1)
+
+    def is_red_black(self):
+        """
+        True if the tree follows all the red-black rules
+        """
+        if _is_red(self._root):
+            return False
+
+        return self._is_red_black(self._root) > 0
+
+
+if __name__ == "__main__":
+
+    print "Creating a red-black tree..."
+    rbt = RBTree()
+    for k in [50, 30, 20, 40, 70, 60, 80, 10, 5]:
+        print "Inserting node (%s)..." % k
+        rbt.insert(k)
+
+    rbt.print_inorder()
+    rbt.print_level_order()
+    print "Is it red-black?  %s" % rbt.is_red_black()
+    print "The max depth:    %s" % rbt.get_max_depth()
+
+    print "Removing node (30)..."
+    rbt.delete(30)
+    print "Removing node (50)..."
+    rbt.delete(50)
+
+    rbt.print_inorder()
+    print "Is it red-black?  %s" % rbt.is_red_black()
+
+    exit(0)
@@ -0,0 +1,621 @@
+#!/usr/bin/python
+
+"""
+Serialization of trees and tries into a compact binary format,
+and the memory-mapped read-only views of the dumped files.
+
+A tree is dumped as its nodes in preorder, with the number of nodes
+in the left subtree of each: the children of the node at i are
+at i + 1 and i + 1 + left size, so the tree is linked back in O(n)
+without comparing or rebalancing, and can be searched in place.
+The header records the balance kind of the tree (none, AVL or red-black),
+a balanced tree is only loaded from a dump of the same kind,
+so that it keeps its invariants (a plain BST takes any dump).
+The sections, each aligned to 8 bytes, are:
+    header       - magic, version, key kind, flags, balance, nodes, keys
+    left sizes   - uint32 per node
+    counts       - uint32 per node, multiset only
+    colors       - 1 bit per node (1 for red), red-black tree only
+    keys         - int64 or float64 per node,
+                   or uint64 offsets into a blob of str (or pickled) keys
+    data         - uint64 offsets into a blob of pickled data,
+                   left out if all the data is None
+
+A trie is dumped as its nodes in breadth first order, with the
+children of each node in character order: the child edges of node i
+are the edges [starts[i], starts[i + 1]), and edge e leads to node e + 1.
+    header       - magic, version, nodes
+    starts       - uint32 per node, plus one
+    edges        - one character per edge
+    data         - uint64 offsets into a blob of pickled data,
+                   an empty one for the nodes which are not a key end
+
+All numbers are little-endian.
+
+Xiaowen Wang
+"""
+
+import cPickle as pickle
+import mmap
+import struct
+
+from node import NodeBase, TrieNode
+
+TREE_MAGIC = 'PYTB'
+TRIE_MAGIC = 'PYTT'
+VERSION = 1
+
+# magic, version, key kind, flags, balance, number of nodes, number of keys
+_TREE_HEADER = struct.Struct('<4sBcBBQQ')
+# magic, version, number of nodes
+_TRIE_HEADER = struct.Struct('<4sBxxxQ')
+
+# The tree flags
+_MULTISET = 1
+_COLORS = 2
+_DATA = 4
+
+# The balance kinds
+_UNBALANCED = 0
+_AVL = 1
+_RED_BLACK = 2
+
+_BALANCE_NAMES = {_UNBALANCED: 'unbalanced', _AVL: 'AVL', _RED_BLACK: 'red-black'}
+
+# The key kinds
+_INT = 'q'
+_FLOAT = 'd'
+_STR = 's'
+_PICKLE = 'p'
+
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+
+
+def _aligned(n):
+    """
+    Round n up to a multiple of 8
+    """
+    return n + (-n % 8)
+
+
+def _key_kind(keys):
+    """
+    Return the kind to store the keys as
+    """
+    if all(type(k) in (int, long) and _INT_MIN <= k <= _INT_MAX for k in keys):
+        return _INT
+    if all(type(k) is float for k in keys):
+        return _FLOAT
+    if all(type(k) is str for k in keys):
+        return _STR
+    return _PICKLE
+
+
+def _balance_kind(cls):
+    """
+    Return the balance kind of the tree class, told by its nodes
+    """
+    if hasattr(cls._node_class, 'is_red'):
+        return _RED_BLACK
+    if hasattr(cls._node_class, 'height'):
+        return _AVL
+    return _UNBALANCED
+
+
+def _blob(items):
+    """
+    Return the uint64 offsets of items (n + 1 of them) and the joined items
+    """
+    offsets = [0]
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    return struct.pack('<%dQ' % len(offsets), *offsets), ''.join(items)
+
+
+def _bits(flags):
+    """
+    Pack a list of bools into bytes, the lowest bit first
+    """
+    out = bytearray((len(flags) + 7) / 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            out[i >> 3] |= 1 << (i & 7)
+    return str(out)
+
+
+class _Writer(object):
+    """
+    Write the sections, each padded to 8 bytes
+    """
+
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, s):
+        self._f.write(s)
+        pad = -len(s) % 8
+        if pad:
+            self._f.write('\0' * pad)
+
+
+def _dumps(data):
+    return pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+
+def dump_tree(tree, path):
+    """
+    Dump a BST (or any subclass of it) into the file of path
+    """
+    # Preorder walk, keeping the nodes and their left subtree sizes.
+    nodes = []
+    lsizes = []
+    stack = [tree.root] if tree.root is not None else []
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        lsizes.append(0)
+        if node.right is not None:
+            stack.append(node.right)
+        if node.left is not None:
+            stack.append(node.left)
+
+    # The left subtree of the node at i is the nodes [i + 1, i + 1 + size),
+    # so count the sizes of the subtrees from the bottom up.
+    n = len(nodes)
+    if n >= 2 ** 32:
+        raise ValueError("too many nodes to dump: %d" % n)
+    sizes = [1] * n
+    index = dict((id(node), i) for i, node in enumerate(nodes))
+    for i in xrange(n - 1, -1, -1):
+        node = nodes[i]
+        if node.left is not None:
+            lsizes[i] = sizes[index[id(node.left)]]
+            sizes[i] += lsizes[i]
+        if node.right is not None:
+            sizes[i] += sizes[index[id(node.right)]]
+    del index, sizes
+
+    keys = [nd.key for nd in nodes]
+    kind = _key_kind(keys)
+
+    flags = 0
+    if tree.multiset:
+        flags |= _MULTISET
+    has_colors = hasattr(tree._node_class, 'is_red')
+    if has_colors:
+        flags |= _COLORS
+    if any(node.data is not None for node in nodes):
+        flags |= _DATA
+
+    with open(path, 'wb') as f:
+        w = _Writer(f)
+        w.write(_TREE_HEADER.pack(TREE_MAGIC, VERSION, kind, flags,
+                                  _balance_kind(type(tree)), n, len(tree)))
+        w.write(struct.pack('<%dI' % n, *lsizes))
+        if flags & _MULTISET:
+            w.write(struct.pack('<%dI' % n, *[nd.count for nd in nodes]))
+        if flags & _COLORS:
+            w.write(_bits([nd.is_red for nd in nodes]))
+
+        if kind in (_INT, _FLOAT):
+            w.write(struct.pack('<%d%s' % (n, kind), *keys))
+            key_blob = None
+        else:
+            if kind == _PICKLE:
+                keys = [_dumps(key) for key in keys]
+            offsets, key_blob = _blob(keys)
+            w.write(offsets)
+
+        data_blob = None
+        if flags & _DATA:
+            offsets, data_blob = _blob([_dumps(nd.data) for nd in nodes])
+            w.write(offsets)
+
+        if key_blob is not None:
+            w.write(key_blob)
+        if data_blob is not None:
+            w.write(data_blob)
+
+
+class _TreeLayout(object):
+    """
+    The sections of a dumped tree in a buffer (str or mmap)
+    """
+
+    def __init__(self, buf):
+        if len(buf) < _TREE_HEADER.size:
+            raise ValueError("not a dumped tree")
+        magic, version, kind, flags, balance, n, size = _TREE_HEADER.unpack_from(buf, 0)
+        if magic != TREE_MAGIC:
+            raise ValueError("not a dumped tree")
+        if version != VERSION:
+            raise ValueError("unsupported version: %d" % version)
+
+        self.buf = buf
+        self.kind = kind
+        self.flags = flags
+        self.balance = balance
+        self.n = n
+        self.size = size  # Number of keys, counted ones included
+
+        pos = _TREE_HEADER.size
+        self.lsizes = pos
+        pos += _aligned(4 * n)
+
+        self.counts = None
+        if flags & _MULTISET:
+            self.counts = pos
+            pos += _aligned(4 * n)
+
+        self.colors = None
+        if flags & _COLORS:
+            self.colors = pos
+            pos += _aligned((n + 7) / 8)
+
+        # The fixed width keys, or the offsets into the key blob
+        self.keys = pos
+        key_blob_size = 0
+        if kind in (_INT, _FLOAT):
+            pos += 8 * n
+        else:
+            pos += _aligned(8 * (n + 1))
+            key_blob_size = struct.unpack_from('<Q', buf, self.keys + 8 * n)[0]
+
+        self.data = None
+        if flags & _DATA:
+            self.data = pos
+            pos += _aligned(8 * (n + 1))
+
+        self.key_blob = pos
+        self.data_blob = pos + _aligned(key_blob_size)
+
+    def lsize(self, i):
+        return struct.unpack_from('<I', self.buf, self.lsizes + 4 * i)[0]
+
+    def key(self, i):
+        kind = self.kind
+        if kind in (_INT, _FLOAT):
+            return struct.unpack_from('<' + kind, self.buf, self.keys + 8 * i)[0]
+
+        start, end = struct.unpack_from('<2Q', self.buf, self.keys + 8 * i)
+        raw = self.buf[self.key_blob + start:self.key_blob + end]
+        return raw if kind == _STR else pickle.loads(raw)
+
+    def data_of(self, i):
+        if self.data is None:
+            return None
+        start, end = struct.unpack_from('<2Q', self.buf, self.data + 8 * i)
+        return pickle.loads(self.buf[self.data_blob + start:self.data_blob + end])
+
+    def count(self, i):
+        if self.counts is None:
+            return 1
+        return struct.unpack_from('<I', self.buf, self.counts + 4 * i)[0]
+
+    def all_keys(self):
+        """
+        Return all the keys in preorder
+        """
+        n = self.n
+        kind = self.kind
+        if kind in (_INT, _FLOAT):
+            return list(struct.unpack_from('<%d%s' % (n, kind), self.buf, self.keys))
+        return self._all_blob(self.keys, self.key_blob,
+                              None if kind == _STR else pickle.loads)
+
+    def all_data(self):
+        """
+        Return all the data in preorder
+        """
+        if self.data is None:
+            return [None] * self.n
+        return self._all_blob(self.data, self.data_blob, pickle.loads)
+
+    def _all_blob(self, offsets, blob, load):
+        n = self.n
+        offsets = struct.unpack_from('<%dQ' % (n + 1), self.buf, offsets)
+        buf = self.buf
+        items = [buf[blob + offsets[i]:blob + offsets[i + 1]] for i in xrange(n)]
+        if load is not None:
+            items = [load(item) for item in items]
+        return items
+
+
+def load_tree(cls, path):
+    """
+    Load a tree of class cls (BST or any subclass of it)
+    from the file of path in O(n).
+    Raise ValueError if cls keeps a balance the dumped tree does not have.
+    """
+    with open(path, 'rb') as f:
+        layout = _TreeLayout(f.read())
+
+    n = layout.n
+    buf = layout.buf
+    balance = _balance_kind(cls)
+    if balance != _UNBALANCED and balance != layout.balance:
+        raise ValueError("cannot load a dumped %s tree into %s" % (
+            _BALANCE_NAMES.get(layout.balance, 'unknown'), cls.__name__))
+    has_colors = balance == _RED_BLACK
+
+    tree = cls(multiset=bool(layout.flags & _MULTISET))
+
+    nodes = [tree._new_node(key, data)
+             for key, data in zip(layout.all_keys(), layout.all_data())]
+
+    if layout.counts is not None:
+        for node, count in zip(nodes, struct.unpack_from('<%dI' % n, buf, layout.counts)):
+            node.count = count
+    if has_colors:
+        colors = bytearray(buf[layout.colors:layout.colors + (n + 7) / 8])
+        for i, node in enumerate(nodes):
+            node.is_red = bool(colors[i >> 3] & (1 << (i & 7)))
+
+    # Link the nodes, each entry is the index of a subtree root,
+    # the number of nodes in the subtree, and its parent.
+    lsizes = struct.unpack_from('<%dI' % n, buf, layout.lsizes)
+    stack = [(0, n, None)] if n else []
+    while stack:
+        i, size, parent = stack.pop()
+        node = nodes[i]
+        node.parent = parent
+        left_size = lsizes[i]
+        right_size = size - 1 - left_size
+        if left_size:
+            node.left = nodes[i + 1]
+            stack.append((i + 1, left_size, node))
+        if right_size:
+            node.right = nodes[i + 1 + left_size]
+            stack.append((i + 1 + left_size, right_size, node))
+
+    # The children come after their parent in preorder,
+    # so the cached fields are refreshed from the last node back.
+    for node in reversed(nodes):
+        tree._update_node(node)
+
+    tree._root = nodes[0] if n else None
+    return tree
+
+
+class MappedTree(object):
+    """
+    Read-only view of a dumped tree mapped into memory,
+    searched straight from the file without building the nodes.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._layout = _TreeLayout(self._mm)
+
+    def __len__(self):
+        return self._layout.size
+
+    def lookup(self, key):
+        """
+        Search a data in the tree
+        """
+        layout = self._layout
+        i = 0
+        size = layout.n
+        while size > 0:
+            current = layout.key(i)
+            if key == current:
+                return NodeBase(current, layout.data_of(i))
+
+            # The left subtree follows the node, then the right one.
+            left_size = layout.lsize(i)
+            if key < current:
+                i += 1
+                size = left_size
+            else:
+                i += 1 + left_size
+                size -= 1 + left_size
+
+        return None
+
+    def count(self, key):
+        """
+        Return the number of the given key in the first node found
+        """
+        layout = self._layout
+        i = 0
+        size = layout.n
+        while size > 0:
+            current = layout.key(i)
+            if key == current:
+                return layout.count(i)
+            left_size = layout.lsize(i)
+            if key < current:
+                i += 1
+                size = left_size
+            else:
+                i += 1 + left_size
+                size -= 1 + left_size
+        return 0
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def dump_trie(trie, path):
+    """
+    Dump a Trie into the file of path
+    """
+    # Breadth first walk, the children in character order.
+    nodes = [trie._root]
+    starts = []
+    edges = []
+    for node in nodes:
+        starts.append(len(edges))
+        for ch in sorted(node.children or ()):
+            edges.append(ch)
+            nodes.append(node.children[ch])
+    starts.append(len(edges))
+
+    n = len(nodes)
+    if n >= 2 ** 32:
+        raise ValueError("too many nodes to dump: %d" % n)
+
+    offsets, data_blob = _blob([_dumps(node.data) if node.is_end else ''
+                                for node in nodes])
+
+    with open(path, 'wb') as f:
+        w = _Writer(f)
+        w.write(_TRIE_HEADER.pack(TRIE_MAGIC, VERSION, n))
+        w.write(struct.pack('<%dI' % (n + 1), *starts))
+        w.write(''.join(edges))
+        w.write(offsets)
+        w.write(data_blob)
+
+
+class _TrieLayout(object):
+    """
+    The sections of a dumped trie in a buffer (str or mmap)
+    """
+
+    def __init__(self, buf):
+        if len(buf) < _TRIE_HEADER.size:
+            raise ValueError("not a dumped trie")
+        magic, version, n = _TRIE_HEADER.unpack_from(buf, 0)
+        if magic != TRIE_MAGIC:
+            raise ValueError("not a dumped trie")
+        if version != VERSION:
+            raise ValueError("unsupported version: %d" % version)
+
+        self.buf = buf
+        self.n = n
+
+        pos = _TRIE_HEADER.size
+        self.starts = pos
+        pos += _aligned(4 * (n + 1))
+        self.edges = pos
+        pos += _aligned(n - 1)
+        self.data = pos
+        pos += _aligned(8 * (n + 1))
+        self.data_blob = pos
+
+
+def load_trie(cls, path):
+    """
+    Load a trie of class cls from the file of path in O(n)
+    """
+    with open(path, 'rb') as f:
+        layout = _TrieLayout(f.read())
+
+    n = layout.n
+    buf = layout.buf
+    starts = struct.unpack_from('<%dI' % (n + 1), buf, layout.starts)
+    edges = buf[layout.edges:layout.edges + n - 1]
+    offsets = struct.unpack_from('<%dQ' % (n + 1), buf, layout.data)
+    blob = layout.data_blob
+
+    nodes = [TrieNode() for _ in xrange(n)]
+    for i, node in enumerate(nodes):
+        start, end = offsets[i], offsets[i + 1]
+        if end > start:
+            node.is_end = True
+            node.data = pickle.loads(buf[blob + start:blob + end])
+
+        if starts[i + 1] > starts[i]:
+            node.children = dict((edges[e], nodes[e + 1])
+                                 for e in xrange(starts[i], starts[i + 1]))
+
+    trie = cls()
+    trie._root = nodes[0]
+    return trie
+
+
+class MappedTrie(object):
+    """
+    Read-only view of a dumped trie mapped into memory,
+    searched straight from the file without building the nodes.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._layout = _TrieLayout(self._mm)
+
+    def search(self, key):
+        """
+        Search a key from trie, return a trie node with the data.
+        """
+        assert isinstance(key, str)
+
+        layout = self._layout
+        mm = self._mm
+        i = 0
+        for ch in key:
+            start, end = struct.unpack_from('<2I', mm, layout.starts + 4 * i)
+            # The child edges are sorted, but few enough for a plain find.
+            e = mm.find(ch, layout.edges + start, layout.edges + end)
+            if e < 0:
+                return None
+            i = e - layout.edges + 1
+
+        start, end = struct.unpack_from('<2Q', mm, layout.data + 8 * i)
+        if end == start:
+            return None
+
+        node = TrieNode()
+        node.is_end = True
+        node.data = pickle.loads(mm[layout.data_blob + start:layout.data_blob + end])
+        return node
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+
+    import os
+    import tempfile
+
+    from avl import AVL
+    from trie import Trie
+
+    print "Creating an AVL tree..."
+    avl = AVL()
+    for k in [50, 30, 20, 40, 70, 60, 80]:
+        avl.insert(k, k * 10)
+
+    path = os.path.join(tempfile.mkdtemp(), 'avl.bin')
+    avl.dump(path)
+    print "Dumped the tree (%d bytes)..." % os.path.getsize(path)
+    loaded = AVL.load(path)
+    loaded.print_inorder()
+    print "Is it balanced? %s" % loaded.is_balanced()
+
+    with MappedTree(path) as mapped:
+        print "Mapped lookup (40): %s" % mapped.lookup(40)
+        print "Mapped lookup (45): %s" % mapped.lookup(45)
+
+    print "Creating a trie..."
+    t = Trie()
+    t.insert("abc", data=1)
+    t.insert("abe", data=2)
+    t.insert("ab", data=3)
+
+    path = os.path.join(os.path.dirname(path), 'trie.bin')
+    t.dump(path)
+    Trie.load(path).display()
+
+    with MappedTrie(path) as mapped:
+        print "Mapped search <abe>: %s" % mapped.search("abe").data
+        print "Mapped search <abd>: %s" % mapped.search("abd")
+
+    exit(0)
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+
+"""
+Splay Tree is a self-adjusting binary search tree.
+Every node accessed by lookup, insert or delete is moved up to
+the root by rotations (splaying), so the keys accessed often stay
+near the top and are found in a few comparisons.
+All operations take amortized O(log n), no balance info is kept.
+
+A lookup changes the shape of the tree: it must be guarded like
+a write when shared by threads (see ctree.py), and it invalidates
+the cursors and indexes of the tree.
+
+Xiaowen Wang
+"""
+
+from bst import BST
+
+
+class SplayTree(BST):
+    """
+    Splay Tree
+    """
+
+    # The lookups change the tree as well.
+    mutating_lookups = True
+
+    def _splay(self, node):
+        """
+        Move the node up to the root by rotations
+        """
+        if node.parent is None:
+            return
+        self._mod_count += 1
+
+        while node.parent is not None:
+            parent = node.parent
+            grandparent = parent.parent
+
+            if grandparent is None:
+                # Zig: the parent is the root.
+                if node is parent.left:
+                    self._rotate_right(parent)
+                else:
+                    self._rotate_left(parent)
+
+            elif (node is parent.left) == (parent is grandparent.left):
+                # Zig-zig: both on the same side,
+                # rotate the grandparent first, then the parent.
+                if node is parent.left:
+                    self._rotate_right(grandparent)
+                    self._rotate_right(parent)
+                else:
+                    self._rotate_left(grandparent)
+                    self._rotate_left(parent)
+
+            else:
+                # Zig-zag: rotate the node up twice.
+                if node is parent.left:
+                    self._rotate_right(parent)
+                    self._rotate_left(grandparent)
+                else:
+                    self._rotate_left(parent)
+                    self._rotate_right(grandparent)
+
+    def lookup(self, key):
+        """
+        Override
+        Search a data in the tree, and splay the node found,
+        or the last node reached if not found.
+        """
+        node = self._lookup(self._root, key)
+        if node is not None:
+            self._splay(node)
+        elif self._root is not None:
+            self._splay(self._last_reached(key))
+        return node
+
+    def _last_reached(self, key):
+        """
+        Return the last node on the search path of a key not in the tree
+        """
+        node = self._root
+        while True:
+            child = node.left if key < node.key else node.right
+            if child is None:
+                return node
+            node = child
+
+    def insert(self, key, data=None):
+        """
+        Override
+        Insert a node to the tree, and splay it
+        """
+        new_node = super(SplayTree, self).insert(key, data)
+        self._splay(new_node)
+        return new_node
+
+    def _delete(self, node, key, parent=None):
+        """
+        Override
+        Remove the node with key from the subtree,
+        and splay the parent of the node taken out.
+        """
+        parent = super(SplayTree, self)._delete(node, key, parent)
+        if parent is not None:
+            self._splay(parent)
+        return parent
+
+
+if __name__ == "__main__":
+
+    print "Creating a splay tree..."
+    st = SplayTree()
+    for k in [50, 30, 20, 40, 70, 60, 80]:
+        print "Inserting node (%s)..." % k
+        st.insert(k)
+
+    st.print_level_order()
+
+    print "Lookup (40): %s" % st.lookup(40)
+    print "The root now: %s" % st.root
+    st.print_level_order()
+
+    print "Removing node (50)..."
+    st.delete(50)
+    st.print_inorder()
+    print "Is the tree valid? %s" % st.is_valid()
+
+    exit(0)
@@ -7,6 +7,7 @@ Xiaowen Wang
 """
 
 from node import TrieNode
+from serial import dump_trie, load_trie
 
 
 class Trie(object):
@@ -17,6 +18,19 @@ class Trie(object):
     def __init__(self):
         self._root = TrieNode()
 
+    def dump(self, path):
+        """
+        Dump the trie into a binary file, see serial.py for the format
+        """
+        dump_trie(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a trie from a binary file in O(n)
+        """
+        return load_trie(cls, path)
+
     def insert(self, key, data=None):
         """
         Insert a key with data to trie.
@@ -28,10 +42,7 @@ class Trie(object):
         # If the character is already existing, move next;
         # otherwise create a new one and move on.
         for ch in key:
-            if not ch in node.children:
-                node.children[ch] = TrieNode()
-
-            node = node.children[ch]
+            node = node.add_child(ch)
 
         # Until the last one, and mark it the end and save the data
         node.is_end = True
@@ -48,11 +59,10 @@ class Trie(object):
         # Traverse trie for each character in the key,
         # if any character not found, just return none.
         for ch in key:
-            if not ch in node.children:
+            node = node.get_child(ch)
+            if node is None:
                 return None
 
-            node = node.children[ch]
-
         # Here the end of key is reached, and check if it is a key end.
         # If not, just return none.
         if not node.is_end:
@@ -61,6 +71,44 @@ class Trie(object):
         # The key-end is found, return the node.
         return node
 
+    def lookup_many(self, keys):
+        """
+        Search a batch of keys from trie,
+        return the trie nodes (None if not found) in the order of keys.
+        """
+        keys = list(keys)
+        result = [None] * len(keys)
+
+        # The keys are searched in sorted order, so that each search
+        # carries on from the common prefix with the previous key.
+        # path[i] is the node reached by the first i characters
+        # of the previous key.
+        path = [self._root]
+        prev = ''
+
+        for i in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[i]
+            assert isinstance(key, str)
+
+            common = 0
+            limit = min(len(key), len(path) - 1)
+            while common < limit and key[common] == prev[common]:
+                common += 1
+            del path[common + 1:]
+
+            node = path[-1]
+            for ch in key[common:]:
+                node = node.get_child(ch)
+                if node is None:
+                    break
+                path.append(node)
+
+            if node is not None and node.is_end:
+                result[i] = node
+            prev = key
+
+        return result
+
     def _delete(self, node, key, i, l):
         if node:
             # Base case: reach the last character.
@@ -76,9 +124,9 @@ class Trie(object):
 
             else:
                 # Recursively crawl down the tree.
-                if self._delete(node.children.get(key[i], None), key, i + 1, l):
+                if self._delete(node.get_child(key[i]), key, i + 1, l):
                     # Delete the child node if it is a leaf.
-                    del node.children[key[i]]
+                    node.remove_child(key[i])
                     # Climb up and check if the current node can be deleted.
                     return node.is_free()
 
@@ -105,7 +153,7 @@ class Trie(object):
             print "%s: %s" % (key_path, node.data)
 
         # Then go through all the children node recursively.
-        for ch in node.children:
+        for ch in node.children or ():
             # Add the current character to the key path
             key_path += ch
             # Recursive depth first traversal to the child